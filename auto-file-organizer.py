@@ -4,14 +4,23 @@
 """
 
 import os
+import mmap
+import stat
+import errno
 import shutil
 import datetime
 import time
 import argparse
+import string
+import bisect
 import re
 import hashlib
+import sqlite3
+import functools
+import tempfile
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # 文件类型映射
 FILE_TYPES = {
@@ -37,12 +46,51 @@ FILE_TYPES = {
     "可执行文件": [".exe", ".msi", ".app", ".bat", ".sh", ".cmd", ".com", ".gadget", ".vb", ".vbs", ".ws", ".wsf"],
 }
 
+# 并行遍历目录的线程数（超过4个线程会在同一卷的目录锁上产生竞争）
+SCAN_WORKERS = 4
+
+# 复制模式下批量并发复制的小文件阈值、每批文件数和线程数
+SMALL_FILE_THRESHOLD = 64 * 1024
+COPY_BATCH_SIZE = 256
+COPY_WORKERS = 8
+
+# 重复文件检测的采样窗口大小，以及采样指纹适用的最小文件大小
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_THRESHOLD = 3 * SAMPLE_SIZE
+
+# 候选文件超过此数量时使用多进程计算哈希，否则使用线程池
+PROCESS_POOL_THRESHOLD = 1000
+
+# 快速比较时读取的文件开头和结尾的字节数
+PARTIAL_SIZE = 4 * 1024
+
+# 超过此大小的文件通过内存映射计算哈希
+MMAP_THRESHOLD = 100 * 1024 * 1024
+
+# 持久化哈希缓存的默认位置
+DEFAULT_HASH_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "auto-file-organizer", "hashdb.sqlite")
+
+# 含反向引用、条件引用、命名组或全局内联标志的模式，合并为一个交替表达式后会出错或含义改变
+RE_UNCOMBINABLE_PATTERN = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
 # 反向映射（扩展名到类型）
 EXT_TO_TYPE = {}
 for folder, extensions in FILE_TYPES.items():
     for ext in extensions:
         EXT_TO_TYPE[ext] = folder
 
+# 热路径上使用的绑定方法，避免每次查找属性
+_ext_get = EXT_TO_TYPE.get
+
+# 按名称整理时首字符到文件夹的映射：英文字母归入对应的大写字母文件夹，数字归入"数字"，其他字符归入"其他"
+_NAME_BUCKET = {c: c.upper() for c in string.ascii_letters}
+_NAME_BUCKET.update((c, "数字") for c in string.digits)
+
+# 类型编号（用于分析模式的批量统计），最后一个编号为"杂项"
+TYPE_NAMES = list(FILE_TYPES) + ["杂项"]
+MISC_TYPE_ID = len(FILE_TYPES)
+EXT_TO_TYPE_ID = {ext: i for i, folder in enumerate(FILE_TYPES) for ext in FILE_TYPES[folder]}
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description="智能文件整理器 - 自动整理杂乱的文件夹")
     
@@ -85,7 +133,34 @@ def parse_arguments():
     parser.add_argument("--organize-by", type=str, choices=["move", "copy", "link"], 
                         default="move", help="整理文件的方式 (默认: 移动)")
     
-    return parser.parse_args()
+    parser.add_argument("--hash-cache", type=str, default=DEFAULT_HASH_CACHE, 
+                        help=f"哈希缓存数据库的路径，未修改的文件无需重新计算哈希 (默认: {DEFAULT_HASH_CACHE})")
+    
+    parser.add_argument("--no-hash-cache", action="store_true", 
+                        help="不使用哈希缓存")
+    
+    args = parser.parse_args()
+    
+    # 预先解析每个文件都会用到的参数
+    try:
+        args._min_size_bytes = parse_size(args.min_size)
+        size_bins = sorted(parse_size(b.strip()) for b in args.size_bins.split(','))
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # 大小区间及对应的文件夹名称，第i个名称对应bisect_right返回的位置i
+    args._size_bins = size_bins
+    args._size_bin_labels = ([f"小于{format_size(size_bins[0])}"] +
+                             [f"{format_size(size_bins[i-1])}-{format_size(size_bins[i])}" for i in range(1, len(size_bins))] +
+                             [f"大于{format_size(size_bins[-1])}"])
+    
+    exclude_patterns = [p.strip() for p in args.exclude.split(',') if p.strip()]
+    try:
+        args._exclude_patterns = compile_patterns(exclude_patterns)
+    except re.error as e:
+        parser.error(f"无效的排除模式 '{e.pattern}': {e}")
+    
+    return args
 
 # 文件大小转换函数
 def parse_size(size_str):
@@ -94,16 +169,21 @@ def parse_size(size_str):
     
     size_str = size_str.upper().replace(" ", "")
     
-    if not re.match(r'^\d+(\.\d+)?[A-Z]+$', size_str):
-        raise ValueError(f"无效的大小格式: {size_str}")
+    # 从末尾向前扫描，分离数字部分和单位部分
+    i = len(size_str)
+    while i and size_str[i - 1].isalpha():
+        i -= 1
+    number_str, unit = size_str[:i], size_str[i:]
     
-    number = float(re.sub(r'[A-Z]+$', '', size_str))
-    unit = re.sub(r'^\d+(\.\d+)?', '', size_str)
+    # 数字部分为整数或小数点两侧都有数字的小数
+    integer, dot, fraction = number_str.partition(".")
+    if not unit or not integer.isdecimal() or (dot and not fraction.isdecimal()):
+        raise ValueError(f"无效的大小格式: {size_str}")
     
     if unit not in units:
         raise ValueError(f"未知的大小单位: {unit}")
     
-    return int(number * units[unit])
+    return int(float(number_str) * units[unit])
 
 def format_size(size_bytes):
     """将字节大小转换为人类可读的格式"""
@@ -118,10 +198,27 @@ def format_size(size_bytes):
     else:
         return f"{size_bytes/(1024**4):.1f}TB"
 
-def should_process_file(file_path, args):
-    """检查是否应该处理此文件"""
+def compile_patterns(patterns, flags=0):
+    """逐个编译正则表达式（无效时抛出re.error），能安全合并时合并为一个交替表达式，返回编译结果的元组"""
+    compiled = tuple(re.compile(p, flags) for p in patterns)
+    
+    # 只判断是否匹配，合并后的结果与逐个搜索相同
+    if len(compiled) > 1 and not any(RE_UNCOMBINABLE_PATTERN.search(p) for p in patterns):
+        try:
+            compiled = (re.compile('|'.join(f'(?:{p})' for p in patterns), flags),)
+        except re.error:
+            pass
+    
+    return compiled
+
+def matches_any(patterns, text):
+    """检查文本是否匹配任意一个已编译的正则表达式"""
+    return any(pattern.search(text) for pattern in patterns)
+
+def should_process_file(file_path, st, args):
+    """检查是否应该处理此文件（st为遍历时获取的stat结果）"""
     # 检查文件大小
-    if os.path.getsize(file_path) < parse_size(args.min_size):
+    if st.st_size < args._min_size_bytes:
         return False
     
     # 检查是否为隐藏文件
@@ -129,28 +226,161 @@ def should_process_file(file_path, args):
         return False
     
     # 检查排除模式
-    if args.exclude:
-        exclude_patterns = [p.strip() for p in args.exclude.split(',')]
-        for pattern in exclude_patterns:
-            if re.search(pattern, file_path):
-                return False
+    if matches_any(args._exclude_patterns, file_path):
+        return False
     
     return True
 
-def get_file_hash(file_path, block_size=65536):
-    """计算文件的SHA-256哈希值"""
-    sha256 = hashlib.sha256()
-    with open(file_path, 'rb') as f:
+def scan_directory(directory, args, recursive=False):
+    """读取单个目录，返回(文件列表, 待遍历的子目录列表)"""
+    files = []
+    subdirs = []
+    
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError as e:
+        print(f"警告: 无法读取目录 '{directory}': {e}")
+        return files, subdirs
+    
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                # 与os.walk一致：不进入指向目录的符号链接
+                if not recursive or entry.is_symlink():
+                    continue
+                
+                # 排除不需要处理的目录
+                if not args.include_hidden and entry.name.startswith('.'):
+                    continue
+                
+                if matches_any(args._exclude_patterns, entry.path):
+                    continue
+                
+                subdirs.append(entry.path)
+            elif entry.is_file():
+                files.append((entry.path, entry.stat()))
+        except OSError:
+            # 文件在遍历期间被删除或无法访问
+            continue
+    
+    return files, subdirs
+
+def iter_files(directory, args, recursive=False):
+    """遍历目录，逐个产出(文件路径, stat结果)，每个文件只调用一次stat"""
+    if not recursive:
+        files, _ = scan_directory(directory, args)
+        yield from files
+        return
+    
+    # 多个线程同时读取不同目录，结果按提交顺序产出以保持输出稳定
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        pending = deque([executor.submit(scan_directory, directory, args, True)])
+        while pending:
+            files, subdirs = pending.popleft().result()
+            for subdir in subdirs:
+                pending.append(executor.submit(scan_directory, subdir, args, True))
+            yield from files
+
+def hash_constructor(name):
+    """返回哈希构造函数；哈希仅用于去重，传入usedforsecurity=False以免在FIPS模式下被禁用或降级"""
+    constructor = getattr(hashlib, name)
+    try:
+        constructor(usedforsecurity=False)
+    except TypeError:
+        # Python 3.9之前不支持该参数
+        return constructor
+    return functools.partial(constructor, usedforsecurity=False)
+
+new_sha256 = hash_constructor("sha256")
+new_md5 = hash_constructor("md5")
+
+def hash_backend():
+    """返回当前SHA-256实现的说明"""
+    if getattr(hashlib.sha256, "__name__", "").startswith("openssl_"):
+        try:
+            import ssl
+            return f"OpenSSL ({ssl.OPENSSL_VERSION})"
+        except ImportError:
+            return "OpenSSL"
+    return "Python内置实现 (无硬件加速)"
+
+def get_file_hash(file_path, size=0, block_size=4 * 1024 * 1024):
+    """计算文件的SHA-256哈希值（size为已知的文件大小）"""
+    with open(file_path, 'rb', buffering=0) as f:
+        # 大文件直接映射到内存，由哈希函数直接读取页面，无需逐块复制
+        if size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                sha256 = new_sha256()
+                sha256.update(mm)
+                return sha256.hexdigest()
+        
+        # Python 3.11+ 的file_digest在C层完成读取与哈希循环
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, new_sha256).hexdigest()
+        
+        sha256 = new_sha256()
         for block in iter(lambda: f.read(block_size), b''):
             sha256.update(block)
     return sha256.hexdigest()
 
-def organize_by_type(file_path, source_dir, args):
-    """按文件类型整理"""
-    _, ext = os.path.splitext(file_path.lower())
+def read_head_tail(file_path, size):
+    """读取文件开头和结尾各4KB（小文件则读取全部内容），用于快速排除不同的文件"""
+    with open(file_path, 'rb') as f:
+        if size <= 2 * PARTIAL_SIZE:
+            return f.read()
+        
+        head = f.read(PARTIAL_SIZE)
+        f.seek(size - PARTIAL_SIZE)
+        return head + f.read(PARTIAL_SIZE)
+
+def sampled_fingerprint(file_path, size):
+    """对文件首、中、尾三段采样计算MD5指纹（小文件则对整个文件计算）"""
+    with open(file_path, 'rb') as f:
+        if size <= SAMPLE_THRESHOLD:
+            return new_md5(f.read()).digest()
+        
+        fingerprint = new_md5()
+        for offset in (0, size // 2 - SAMPLE_SIZE // 2, size - SAMPLE_SIZE):
+            f.seek(offset)
+            fingerprint.update(new_md5(f.read(SAMPLE_SIZE)).digest())
+        return fingerprint.digest()
+
+def open_hash_cache(cache_path):
+    """打开（必要时创建）持久化哈希缓存数据库"""
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        conn = sqlite3.connect(cache_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS hashes "
+                     "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, sha256 TEXT)")
+    except (OSError, sqlite3.Error) as e:
+        print(f"警告: 无法打开哈希缓存 '{cache_path}': {e}")
+        return None
+    return conn
+
+def lookup_cached_hash(conn, file_path, st):
+    """查询缓存的哈希值，文件大小、修改时间或inode变化时视为失效"""
+    row = conn.execute("SELECT size, mtime_ns, inode, sha256 FROM hashes WHERE path = ?",
+                       (os.path.abspath(file_path),)).fetchone()
+    if row and row[:3] == (st.st_size, st.st_mtime_ns, st.st_ino):
+        return row[3]
+    return None
+
+def save_cached_hashes(conn, rows, batch_size=1000):
+    """分批写入新计算的哈希值"""
+    for i in range(0, len(rows), batch_size):
+        conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", rows[i:i + batch_size])
+        conn.commit()
+
+def organize_by_type(ext_lower, source_dir, args):
+    """按文件类型整理（ext_lower为小写的扩展名）"""
+    folder = _ext_get(ext_lower)
     
-    if ext in EXT_TO_TYPE:
-        target_dir = os.path.join(source_dir, EXT_TO_TYPE[ext])
+    if folder:
+        target_dir = os.path.join(source_dir, folder)
     else:
         if args.no_misc:
             return None
@@ -158,71 +388,104 @@ def organize_by_type(file_path, source_dir, args):
     
     return target_dir
 
-def organize_by_date(file_path, source_dir, args):
+def organize_by_date(file_path, st, source_dir, args):
     """按文件修改日期整理"""
-    mod_time = os.path.getmtime(file_path)
-    date_str = datetime.datetime.fromtimestamp(mod_time).strftime(args.date_format)
+    date_str = datetime.datetime.fromtimestamp(st.st_mtime).strftime(args.date_format)
     target_dir = os.path.join(source_dir, date_str)
     return target_dir
 
-def organize_by_name(file_path, source_dir, args):
+def organize_by_name(file_path, st, source_dir, args):
     """按文件名首字母整理"""
     filename = os.path.basename(file_path)
     
-    # 获取首字母或首个汉字
-    first_char = filename[0].upper()
-    
-    # 英文字母归类到相应字母文件夹
-    if 'A' <= first_char <= 'Z':
-        target_dir = os.path.join(source_dir, first_char)
-    # 数字归类到"数字"文件夹
-    elif '0' <= first_char <= '9':
-        target_dir = os.path.join(source_dir, "数字")
     # 汉字和其他字符归类到"其他"文件夹
-    else:
-        target_dir = os.path.join(source_dir, "其他")
-    
-    return target_dir
+    return os.path.join(source_dir, _NAME_BUCKET.get(filename[:1], "其他"))
 
-def organize_by_size(file_path, source_dir, args):
+def organize_by_size(file_path, st, source_dir, args):
     """按文件大小整理"""
-    size = os.path.getsize(file_path)
-    
-    # 解析大小区间
-    size_bins = [parse_size(bin_str.strip()) for bin_str in args.size_bins.split(',')]
-    size_bins.sort()
-    
-    # 确定文件所属区间
-    for i, bin_size in enumerate(size_bins):
-        if size < bin_size:
-            if i == 0:
-                return os.path.join(source_dir, f"小于{format_size(bin_size)}")
-            else:
-                return os.path.join(source_dir, f"{format_size(size_bins[i-1])}-{format_size(bin_size)}")
-    
-    # 大于最大区间
-    return os.path.join(source_dir, f"大于{format_size(size_bins[-1])}")
+    # 确定文件所属区间（区间在解析参数时已预先计算）
+    i = bisect.bisect_right(args._size_bins, st.st_size)
+    return os.path.join(source_dir, args._size_bin_labels[i])
 
-def find_duplicates(file_paths):
-    """查找重复文件"""
+def find_duplicates(files, hash_cache=None):
+    """查找重复文件（files为(文件路径, stat结果)列表，hash_cache为哈希缓存路径）"""
     # 首先按大小分组
     size_groups = defaultdict(list)
-    for file_path in file_paths:
-        size = os.path.getsize(file_path)
-        size_groups[size].append(file_path)
+    stats = {}
+    for file_path, st in files:
+        size_groups[st.st_size].append(file_path)
+        stats[file_path] = st
     
     # 然后只对相同大小的文件计算哈希值
     duplicates = []
     hash_groups = defaultdict(list)
     
     # 只处理有多个文件的大小组
-    for size, files in size_groups.items():
-        if len(files) < 2:
-            continue
+    candidates = [(file_path, size) for size, files in size_groups.items() if len(files) > 1 for file_path in files]
+    
+    if candidates:
+        # 候选文件较多时使用多进程并行计算；较少时进程启动开销不划算，
+        # 使用线程池（哈希计算时会释放GIL），同时让多个文件的读取相互重叠
+        if len(candidates) > PROCESS_POOL_THRESHOLD:
+            executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        else:
+            executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2))
         
-        for file_path in files:
-            file_hash = get_file_hash(file_path)
-            hash_groups[file_hash].append(file_path)
+        with executor:
+            # 先比较文件开头和结尾的字节，排除大部分不同的文件
+            partial_groups = defaultdict(list)
+            paths = [file_path for file_path, _ in candidates]
+            sizes = [size for _, size in candidates]
+            partials = executor.map(read_head_tail, paths, sizes, chunksize=16)
+            for file_path, size, partial in zip(paths, sizes, partials):
+                partial_groups[(size, partial)].append(file_path)
+            
+            candidates = []
+            for (size, _), files in partial_groups.items():
+                if len(files) < 2:
+                    continue
+                # 小文件已经比较了全部内容，无需再计算哈希
+                if size <= 2 * PARTIAL_SIZE:
+                    duplicates.append(files)
+                else:
+                    candidates.extend((file_path, size) for file_path in files)
+            
+            # 再按采样指纹分组，大文件只需读取三个采样窗口
+            fingerprint_groups = defaultdict(list)
+            paths = [file_path for file_path, _ in candidates]
+            sizes = [size for _, size in candidates]
+            fingerprints = executor.map(sampled_fingerprint, paths, sizes, chunksize=16)
+            for file_path, size, fingerprint in zip(paths, sizes, fingerprints):
+                fingerprint_groups[(size, fingerprint)].append(file_path)
+            
+            # 最后只对指纹相同的文件计算完整的SHA-256
+            candidates = [file_path for files in fingerprint_groups.values() if len(files) > 1 for file_path in files]
+            
+            # 跳过缓存中未变化的文件
+            conn = open_hash_cache(hash_cache) if hash_cache and candidates else None
+            file_hashes = {}
+            if conn:
+                for file_path in candidates:
+                    cached = lookup_cached_hash(conn, file_path, stats[file_path])
+                    if cached:
+                        file_hashes[file_path] = cached
+            
+            to_hash = [file_path for file_path in candidates if file_path not in file_hashes]
+            futures = {executor.submit(get_file_hash, file_path, stats[file_path].st_size): file_path
+                       for file_path in to_hash}
+            for future in as_completed(futures):
+                file_hashes[futures[future]] = future.result()
+            
+            if conn:
+                rows = []
+                for file_path in to_hash:
+                    st = stats[file_path]
+                    rows.append((os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino, file_hashes[file_path]))
+                save_cached_hashes(conn, rows)
+                conn.close()
+            
+            for file_path in candidates:
+                hash_groups[file_hashes[file_path]].append(file_path)
     
     # 收集重复文件（有相同哈希值的文件）
     for hash_val, files in hash_groups.items():
@@ -231,61 +494,177 @@ def find_duplicates(file_paths):
     
     return duplicates
 
-def organize_by_custom(file_path, source_dir, args, rules=None):
+def organize_by_custom(file_path, st, source_dir, args, rules=None):
     """使用自定义规则整理文件"""
     if not rules:
         return None
     
     filename = os.path.basename(file_path)
-    ext = os.path.splitext(filename)[1].lower()
+    categories = rules["categories"]
+    
+    # 字面量规则一次扫描即可找出匹配的、排在最前面的类别
+    matched = len(categories)
+    if rules["literals"] is not None:
+        for _, index in rules["literals"].iter(filename.lower()):
+            matched = min(matched, index)
     
-    for rule_name, patterns in rules.items():
-        for pattern in patterns:
-            if re.search(pattern, filename, re.IGNORECASE):
-                return os.path.join(source_dir, rule_name)
+    # 只需检查排在该类别之前的正则规则
+    for index in range(matched):
+        if matches_any(rules["patterns"][index], filename):
+            matched = index
+            break
+    
+    if matched < len(categories):
+        return os.path.join(source_dir, categories[matched])
     
     if args.no_misc:
         return None
     return os.path.join(source_dir, "杂项")
 
-def process_file(file_path, source_dir, args, rules=None):
+# 已创建的目标目录、每个目录中已占用的文件名，以及目录是否大小写不敏感
+# （大小写不敏感的目录中文件名统一转为casefold后比较）
+_created_dirs = set()
+_dir_names = {}
+_case_insensitive_dirs = set()
+
+def is_case_insensitive_dir(directory):
+    """在目录中创建一个临时文件，检查改变大小写后的名称是否指向同一个文件"""
+    fd, path = tempfile.mkstemp(prefix=".organizer-case-", dir=directory)
+    os.close(fd)
+    try:
+        head, tail = os.path.split(path)
+        return os.path.exists(os.path.join(head, tail.upper()))
+    finally:
+        os.remove(path)
+
+def target_name_key(target_dir, filename):
+    """返回用于判断文件名冲突的键，只有大小写不敏感的目录才忽略大小写"""
+    return filename.casefold() if target_dir in _case_insensitive_dirs else filename
+
+def prepare_target_dir(target_dir):
+    """创建目标目录（每个目录只创建和列出一次），返回其中已占用的文件名集合"""
+    if target_dir not in _created_dirs:
+        os.makedirs(target_dir, exist_ok=True)
+        _created_dirs.add(target_dir)
+        if is_case_insensitive_dir(target_dir):
+            _case_insensitive_dirs.add(target_dir)
+        _dir_names[target_dir] = {target_name_key(target_dir, name) for name in os.listdir(target_dir)}
+    return _dir_names[target_dir]
+
+def unique_target_path(target_dir, filename):
+    """在目标目录中为文件选择一个不冲突的名称"""
+    names = prepare_target_dir(target_dir)
+    name, ext = os.path.splitext(filename)
+    candidate = filename
+    counter = 1
+    while target_name_key(target_dir, candidate) in names:
+        candidate = f"{name}_{counter}{ext}"
+        counter += 1
+    names.add(target_name_key(target_dir, candidate))
+    return os.path.join(target_dir, candidate)
+
+# 目标目录所在的设备号，用于判断能否直接重命名
+_dir_dev = {}
+
+def copy_file(src, st, target_path):
+    """复制文件内容，并根据已有的stat结果恢复权限和时间戳"""
+    if hasattr(os, "copy_file_range"):
+        with open(src, 'rb') as fsrc, open(target_path, 'wb') as fdst:
+            try:
+                # 在内核中复制数据，支持reflink的文件系统上无需实际复制
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024**3):
+                    pass
+            except OSError:
+                # 内核或文件系统不支持时，从当前位置继续普通复制
+                shutil.copyfileobj(fsrc, fdst)
+    else:
+        shutil.copyfile(src, target_path)
+    
+    os.chmod(target_path, stat.S_IMODE(st.st_mode))
+    os.utime(target_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def copy_small_files(batch):
+    """并发复制一批小文件（batch为(源路径, stat结果, 目标路径, 相对路径)列表），返回(成功数, 失败数)"""
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        futures = [executor.submit(copy_file, src, st, target_path) for src, st, target_path, _ in batch]
+    
+    failed = 0
+    for (_, _, _, rel_path), future in zip(batch, futures):
+        error = future.exception()
+        if error:
+            print(f"错误: 无法处理文件 '{rel_path}': {error}")
+            failed += 1
+    return len(batch) - failed, failed
+
+def transfer_file(src, st, target_path, organize_by):
+    """按指定方式移动、复制或链接文件"""
+    if organize_by == "move":
+        target_dir = os.path.dirname(target_path)
+        if target_dir not in _dir_dev:
+            _dir_dev[target_dir] = os.stat(target_dir).st_dev
+        
+        # 同一文件系统内只需一次重命名
+        if st.st_dev == _dir_dev[target_dir]:
+            try:
+                os.replace(src, target_path)
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        shutil.move(src, target_path)
+    elif organize_by == "copy":
+        copy_file(src, st, target_path)
+    elif organize_by == "link":
+        # 遍历得到的路径已经是绝对路径
+        os.symlink(src, target_path)
+
+def process_file(file_path, st, source_dir, args, rules=None):
     """处理单个文件"""
-    if not should_process_file(file_path, args):
+    if not should_process_file(file_path, st, args):
         return None
     
+    filename = os.path.basename(file_path)
+    
     # 根据所选模式确定目标目录
     if args.mode == "type":
-        target_dir = organize_by_type(file_path, source_dir, args)
+        target_dir = organize_by_type(os.path.splitext(filename)[1].lower(), source_dir, args)
     elif args.mode == "date":
-        target_dir = organize_by_date(file_path, source_dir, args)
+        target_dir = organize_by_date(file_path, st, source_dir, args)
     elif args.mode == "name":
-        target_dir = organize_by_name(file_path, source_dir, args)
+        target_dir = organize_by_name(file_path, st, source_dir, args)
     elif args.mode == "size":
-        target_dir = organize_by_size(file_path, source_dir, args)
+        target_dir = organize_by_size(file_path, st, source_dir, args)
     elif args.mode == "custom":
-        target_dir = organize_by_custom(file_path, source_dir, args, rules)
+        target_dir = organize_by_custom(file_path, st, source_dir, args, rules)
     else:
         return None
     
     if not target_dir:
         return None
     
-    # 创建目标目录（如果是dry run则仅打印）
-    if not args.dry_run and not os.path.exists(target_dir):
-        os.makedirs(target_dir)
-    
-    # 确定目标文件路径
-    filename = os.path.basename(file_path)
-    target_path = os.path.join(target_dir, filename)
+    # 如果是dry run则仅显示目标路径，不创建目录
+    if args.dry_run:
+        return os.path.join(target_dir, filename)
     
-    # 处理文件名冲突
-    counter = 1
-    while os.path.exists(target_path) and not args.dry_run:
-        name, ext = os.path.splitext(filename)
-        target_path = os.path.join(target_dir, f"{name}_{counter}{ext}")
-        counter += 1
+    # 创建目标目录并处理文件名冲突
+    return unique_target_path(target_dir, filename)
+
+def build_literal_matcher(literals):
+    """为(字面量, 类别编号)列表构建Aho-Corasick自动机，未安装pyahocorasick时返回None"""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
     
-    return target_path
+    automaton = ahocorasick.Automaton()
+    for literal, index in literals:
+        key = literal.lower()
+        # 同一字面量出现在多个类别中时，保留排在前面的类别
+        if key in automaton:
+            index = min(index, automaton.get(key))
+        automaton.add_word(key, index)
+    automaton.make_automaton()
+    return automaton
 
 def load_custom_rules(rules_file):
     """从文件加载自定义规则"""
@@ -312,7 +691,47 @@ def load_custom_rules(rules_file):
             elif current_category is not None:
                 rules[current_category].append(line)
     
-    return rules
+    categories = [category for category, patterns in rules.items() if patterns]
+    if not categories:
+        return None
+    
+    # 不含正则元字符的规则是普通字面量，可以交给Aho-Corasick自动机统一匹配
+    literals = [(p, i) for i, category in enumerate(categories) for p in rules[category] if re.escape(p) == p]
+    automaton = build_literal_matcher(literals) if literals else None
+    
+    # 其余规则按类别编译，能安全合并时每个类别只需一次搜索
+    patterns = []
+    for category in categories:
+        remaining = [p for p in rules[category] if automaton is None or re.escape(p) != p]
+        try:
+            patterns.append(compile_patterns(remaining, re.IGNORECASE))
+        except re.error as e:
+            print(f"错误: 类别 '{category}' 中的规则 '{e.pattern}' 无效: {e}")
+            return None
+    
+    return {"categories": categories, "patterns": patterns, "literals": automaton}
+
+def count_by_id(ids, sizes, n):
+    """按编号汇总文件数量和总大小，返回(数量列表, 大小列表)"""
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    
+    # 有numpy时在C层一次性完成汇总
+    if np is not None and ids:
+        ids_array = np.fromiter(ids, dtype=np.intp, count=len(ids))
+        sizes_array = np.fromiter(sizes, dtype=np.float64, count=len(sizes))
+        counts = np.bincount(ids_array, minlength=n)
+        totals = np.bincount(ids_array, weights=sizes_array, minlength=n)
+        return counts.tolist(), totals.astype(np.int64).tolist()
+    
+    counts = [0] * n
+    totals = [0] * n
+    for i, size in zip(ids, sizes):
+        counts[i] += 1
+        totals[i] += size
+    return counts, totals
 
 def analyze_directory(directory, args):
     """分析目录并生成报告"""
@@ -320,47 +739,34 @@ def analyze_directory(directory, args):
     print("=" * 60)
     
     all_files = []
-    total_size = 0
-    extension_count = defaultdict(int)
-    extension_size = defaultdict(int)
-    type_count = defaultdict(int)
-    type_size = defaultdict(int)
-    
-    # 遍历目录
-    for root, dirs, files in os.walk(directory):
-        # 排除不需要处理的目录
-        if not args.include_hidden:
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
+    sizes = []
+    type_ids = []
+    ext_ids = []
+    ext_index = {}
+    
+    # 遍历目录，只记录每个文件的大小、类型编号和扩展名编号
+    for file_path, st in iter_files(directory, args, recursive=True):
+        # 检查是否应该处理此文件
+        if not should_process_file(file_path, st, args):
+            continue
         
-        if args.exclude:
-            exclude_patterns = [p.strip() for p in args.exclude.split(',')]
-            for pattern in exclude_patterns:
-                dirs[:] = [d for d in dirs if not re.search(pattern, os.path.join(root, d))]
+        all_files.append((file_path, st))
+        sizes.append(st.st_size)
         
-        for file in files:
-            file_path = os.path.join(root, file)
-            
-            # 检查是否应该处理此文件
-            if not should_process_file(file_path, args):
-                continue
-            
-            all_files.append(file_path)
-            
-            # 统计文件大小
-            size = os.path.getsize(file_path)
-            total_size += size
-            
-            # 统计扩展名
-            _, ext = os.path.splitext(file.lower())
-            extension_count[ext] += 1
-            extension_size[ext] += size
-            
-            # 统计文件类型
-            file_type = "杂项"
-            if ext in EXT_TO_TYPE:
-                file_type = EXT_TO_TYPE[ext]
-            type_count[file_type] += 1
-            type_size[file_type] += size
+        # 扩展名和文件类型复用同一个扩展名
+        ext = os.path.splitext(os.path.basename(file_path))[1].lower()
+        type_ids.append(EXT_TO_TYPE_ID.get(ext, MISC_TYPE_ID))
+        ext_ids.append(ext_index.setdefault(ext, len(ext_index)))
+    
+    # 批量汇总统计
+    total_size = sum(sizes)
+    counts, totals = count_by_id(type_ids, sizes, len(TYPE_NAMES))
+    type_count = {TYPE_NAMES[i]: c for i, c in enumerate(counts) if c}
+    type_size = {TYPE_NAMES[i]: totals[i] for i, c in enumerate(counts) if c}
+    
+    counts, totals = count_by_id(ext_ids, sizes, len(ext_index))
+    extension_count = {ext: counts[i] for ext, i in ext_index.items()}
+    extension_size = {ext: totals[i] for ext, i in ext_index.items()}
     
     # 打印总体统计
     print(f"总文件数: {len(all_files)}")
@@ -390,18 +796,20 @@ def analyze_directory(directory, args):
     
     # 查找重复文件
     print("\n🔍 查找重复文件...")
-    duplicates = find_duplicates(all_files)
+    duplicates = find_duplicates(all_files, None if args.no_hash_cache else args.hash_cache)
+    # 复用遍历时得到的文件大小，无需再次stat
+    stats = dict(all_files)
+    dup_size = sum(stats[group[0]].st_size * (len(group) - 1) for group in duplicates)
     
     if duplicates:
         dup_count = sum(len(group) for group in duplicates)
-        dup_size = sum(os.path.getsize(group[0]) * (len(group) - 1) for group in duplicates)
         print(f"找到 {len(duplicates)} 组重复文件，共 {dup_count} 个文件")
         print(f"可节省空间: {format_size(dup_size)}")
         
         # 打印前5组重复文件
         print("\n示例重复文件组:")
         for i, group in enumerate(duplicates[:5]):
-            print(f"\n组 {i+1} ({len(group)} 个文件，每个 {format_size(os.path.getsize(group[0]))})")
+            print(f"\n组 {i+1} ({len(group)} 个文件，每个 {format_size(stats[group[0]].st_size)})")
             for j, file_path in enumerate(group[:3]):
                 print(f"  {j+1}. {os.path.relpath(file_path, directory)}")
             if len(group) > 3:
@@ -413,9 +821,8 @@ def analyze_directory(directory, args):
     
     # 根据分析结果给出建议
     if duplicates:
-        potential_savings = sum(os.path.getsize(group[0]) * (len(group) - 1) for group in duplicates)
-        if potential_savings > total_size * 0.1:  # 如果可以节省超过10%的空间
-            print(f"- 处理重复文件可以节省 {format_size(potential_savings)} ({(potential_savings/total_size*100):.1f}%) 的空间")
+        if dup_size > total_size * 0.1:  # 如果可以节省超过10%的空间
+            print(f"- 处理重复文件可以节省 {format_size(dup_size)} ({(dup_size/total_size*100):.1f}%) 的空间")
     
     # 建议整理大型文件类型
     large_types = [(t, s) for t, s in type_size.items() if s > total_size * 0.2]
@@ -441,6 +848,8 @@ def organize_files(args):
     print(f"\n🚀 智能文件整理器")
     print(f"源目录: {source_dir}")
     print(f"模式: {args.mode}")
+    if args.mode in ("duplicate", "analyze"):
+        print(f"哈希实现: {hash_backend()}")
     print(f"{'(仅显示操作，不实际移动文件)' if args.dry_run else ''}")
     print("=" * 60)
     
@@ -459,33 +868,11 @@ def organize_files(args):
         if not custom_rules:
             return
     
-    # 收集要处理的文件
-    all_files = []
-    
-    if args.recursive:
-        for root, dirs, files in os.walk(source_dir):
-            # 排除不需要处理的目录
-            if not args.include_hidden:
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            if args.exclude:
-                exclude_patterns = [p.strip() for p in args.exclude.split(',')]
-                for pattern in exclude_patterns:
-                    dirs[:] = [d for d in dirs if not re.search(pattern, os.path.join(root, d))]
-            
-            for file in files:
-                file_path = os.path.join(root, file)
-                all_files.append(file_path)
-    else:
-        for file in os.listdir(source_dir):
-            file_path = os.path.join(source_dir, file)
-            if os.path.isfile(file_path):
-                all_files.append(file_path)
-    
-    # 重复文件处理
+    # 重复文件处理（需要完整的文件列表）
     if args.mode == "duplicate":
+        all_files = list(iter_files(source_dir, args, recursive=args.recursive))
         print("查找重复文件...")
-        duplicates = find_duplicates(all_files)
+        duplicates = find_duplicates(all_files, None if args.no_hash_cache else args.hash_cache)
         
         if not duplicates:
             print("没有发现重复文件。")
@@ -493,8 +880,7 @@ def organize_files(args):
         
         # 创建重复文件目录
         duplicate_dir = os.path.join(source_dir, "重复文件")
-        if not args.dry_run and not os.path.exists(duplicate_dir):
-            os.makedirs(duplicate_dir)
+        stats = dict(all_files)
         
         print(f"\n找到 {len(duplicates)} 组重复文件:")
         
@@ -505,43 +891,37 @@ def organize_files(args):
             duplicates_to_move = group[1:]
             
             group_dir = os.path.join(duplicate_dir, f"组_{i+1}")
-            if not args.dry_run and not os.path.exists(group_dir):
-                os.makedirs(group_dir)
             
-            print(f"\n组 {i+1} ({len(group)} 个文件, 每个 {format_size(os.path.getsize(original))})")
+            print(f"\n组 {i+1} ({len(group)} 个文件, 每个 {format_size(stats[original].st_size)})")
             print(f"  保留: {os.path.relpath(original, source_dir)}")
             
             for dup in duplicates_to_move:
-                saved_space = os.path.getsize(dup)
+                saved_space = stats[dup].st_size
                 total_saved += saved_space
                 
                 target_path = os.path.join(group_dir, os.path.basename(dup))
                 print(f"  移动: {os.path.relpath(dup, source_dir)} -> {os.path.relpath(target_path, source_dir)}")
                 
                 if not args.dry_run:
-                    counter = 1
-                    while os.path.exists(target_path):
-                        name, ext = os.path.splitext(os.path.basename(dup))
-                        target_path = os.path.join(group_dir, f"{name}_{counter}{ext}")
-                        counter += 1
-                    
-                    if args.organize_by == "move":
-                        shutil.move(dup, target_path)
-                    elif args.organize_by == "copy":
-                        shutil.copy2(dup, target_path)
-                    elif args.organize_by == "link":
-                        os.symlink(os.path.abspath(dup), target_path)
+                    target_path = unique_target_path(group_dir, os.path.basename(dup))
+                    transfer_file(dup, stats[dup], target_path, args.organize_by)
         
         print(f"\n总计: 处理了 {sum(len(g)-1 for g in duplicates)} 个重复文件")
         print(f"可节省空间: {format_size(total_saved)}")
         return
     
-    # 处理所有文件
+    # 边遍历边处理，无需先收集所有文件
     file_count = 0
     moved_count = 0
     skipped_count = 0
+    small_copies = []
+    # 本次运行产生的目标文件，递归遍历尚未读取的目录时可能再次遇到
+    produced_paths = set()
     
-    for file_path in all_files:
+    for file_path, st in iter_files(source_dir, args, recursive=args.recursive):
+        if file_path in produced_paths:
+            continue
+        
         rel_path = os.path.relpath(file_path, source_dir)
         
         # 如果是递归模式且保持结构，需要调整目标目录
@@ -552,7 +932,7 @@ def organize_files(args):
             sub_source_dir = source_dir
         
         # 处理文件
-        target_path = process_file(file_path, sub_source_dir, args, custom_rules)
+        target_path = process_file(file_path, st, sub_source_dir, args, custom_rules)
         
         if not target_path:
             skipped_count += 1
@@ -567,19 +947,30 @@ def organize_files(args):
         
         # 执行操作（除非是预览模式）
         if not args.dry_run:
+            produced_paths.add(target_path)
+            
+            # 小文件的复制攒成一批并发执行，让多个I/O请求同时进行
+            if args.organize_by == "copy" and st.st_size <= SMALL_FILE_THRESHOLD:
+                small_copies.append((file_path, st, target_path, rel_path))
+                if len(small_copies) >= COPY_BATCH_SIZE:
+                    copied, failed = copy_small_files(small_copies)
+                    moved_count += copied
+                    skipped_count += failed
+                    small_copies = []
+                continue
+            
             try:
-                if args.organize_by == "move":
-                    shutil.move(file_path, target_path)
-                elif args.organize_by == "copy":
-                    shutil.copy2(file_path, target_path)
-                elif args.organize_by == "link":
-                    os.symlink(os.path.abspath(file_path), target_path)
-                
+                transfer_file(file_path, st, target_path, args.organize_by)
                 moved_count += 1
             except Exception as e:
                 print(f"错误: 无法处理文件 '{rel_path}': {e}")
                 skipped_count += 1
     
+    if small_copies:
+        copied, failed = copy_small_files(small_copies)
+        moved_count += copied
+        skipped_count += failed
+    
     print("\n" + "=" * 60)
     if args.dry_run:
         print(f"预览完成: 将处理 {file_count} 个文件 (跳过 {skipped_count} 个)")
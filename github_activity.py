@@ -4,6 +4,8 @@ GitHub活动模拟器 - 更安全的版本，不会污染现有仓库
 """
 
 import os
+import sys
+import io
 import random
 import datetime
 import subprocess
@@ -11,10 +13,17 @@ import time
 import argparse
 import tempfile
 import shutil
-from pathlib import Path
+import shlex
+from itertools import islice
+
+# numpy可选，安装后用于批量生成随机数
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # 可能的提交消息列表
-COMMIT_MESSAGES = [
+COMMIT_MESSAGES = (
     "更新文档",
     "修复bug",
     "添加新功能",
@@ -35,18 +44,24 @@ COMMIT_MESSAGES = [
     "优化查询",
     "更新配置",
     "重构模块",
-]
+)
+
+# 每输出多少条提交记录刷新一次终端
+PROGRESS_FLUSH_EVERY = 64
+
+# 星期的中文名称，按weekday()的顺序排列
+WEEKDAY_ZH = ('周一', '周二', '周三', '周四', '周五', '周六', '周日')
 
 # 可能的文件类型列表
-FILE_TYPES = [
-    (".py", ["# 更新Python代码", "def function():", "class MyClass:", "import random", "# TODO: 实现这个功能"]),
-    (".js", ["// JavaScript更新", "function update() {", "const newFeature = () => {", "// 修复这个问题"]),
-    (".html", ["<!-- HTML更新 -->", "<div>", "<section>", "<p>内容更新</p>"]),
-    (".css", ["/* CSS更新 */", ".new-class {", "margin: 0 auto;", "display: flex;"]),
-    (".md", ["# 文档更新", "## 新部分", "* 列表项", "更新说明"]),
-    (".json", ['"key": "value"', '"updated": true', '"version": "1.0.1"']),
-    (".txt", ["更新文本", "添加描述", "修复文档"]),
-]
+FILE_TYPES = (
+    (".py", ("# 更新Python代码", "def function():", "class MyClass:", "import random", "# TODO: 实现这个功能")),
+    (".js", ("// JavaScript更新", "function update() {", "const newFeature = () => {", "// 修复这个问题")),
+    (".html", ("<!-- HTML更新 -->", "<div>", "<section>", "<p>内容更新</p>")),
+    (".css", ("/* CSS更新 */", ".new-class {", "margin: 0 auto;", "display: flex;")),
+    (".md", ("# 文档更新", "## 新部分", "* 列表项", "更新说明")),
+    (".json", ('"key": "value"', '"updated": true', '"version": "1.0.1"')),
+    (".txt", ("更新文本", "添加描述", "修复文档")),
+)
 
 def parse_arguments():
     """解析命令行参数"""
@@ -65,73 +80,154 @@ def parse_arguments():
     parser.add_argument("--file-prefix", type=str, default="auto_", help="自动创建文件的前缀")
     parser.add_argument("--keep-temp", action="store_true", help="保留临时目录（仅适用于temp-repo方法）")
     parser.add_argument("--remote", type=str, default="origin", help="远程仓库名称")
+    parser.add_argument("--human-pace", action="store_true", help="每次提交后随机等待0.1-0.5秒，模拟人工操作的节奏")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，指定后可以重现同样的提交计划")
     return parser.parse_args()
 
-def create_or_update_file(repo_path, file_prefix):
-    """创建或更新仓库中的文件"""
-    # 随机选择文件类型和内容
-    file_ext, content_options = random.choice(FILE_TYPES)
-    
-    # 生成文件名 (使用时间戳以确保唯一性)
-    timestamp = int(time.time())
-    file_name = f"{file_prefix}{timestamp}{file_ext}"
-    file_path = os.path.join(repo_path, file_name)
+def make_content(file_type):
+    """生成文件的随机内容 (file_type为FILE_TYPES中的一项)，直接返回字节串"""
+    _, content_options = file_type
+    num_lines = random.randint(3, 10)
+    return ("\n".join(random.choices(content_options, k=num_lines)) + "\n").encode()
+
+def quote_command(cmd):
+    """将参数列表转换为当前平台shell可执行的命令字符串"""
+    if os.name == "nt":
+        return subprocess.list2cmdline(cmd)
+    return " ".join(shlex.quote(arg) for arg in cmd)
+
+def run_git_commands(repo_path, commands):
+    """在一个shell进程中依次执行多条git命令，任一命令失败即停止"""
+    script = " && ".join(quote_command(cmd) for cmd in commands)
+    subprocess.run(script, shell=True, cwd=repo_path, check=True)
+
+def plan_commits(args, rng=None):
+    """生成整个模拟期间的提交计划，按天排列的(提交时间, 消息编号, 文件类型编号)列表 (rng为空时使用random模块)"""
+    # 获取当前日期
+    today = datetime.datetime.now().date()
     
-    # 确保目录存在
-    Path(repo_path).mkdir(parents=True, exist_ok=True)
+    # 计算起始日期
+    if args.backdate:
+        start_date = today - datetime.timedelta(days=args.days - 1)
+    else:
+        start_date = today
     
-    # 写入随机内容到文件
-    with open(file_path, "w") as f:
-        num_lines = random.randint(3, 10)
-        for _ in range(num_lines):
-            f.write(random.choice(content_options) + "\n")
+    days = [start_date + datetime.timedelta(days=i) for i in range(args.days)]
     
-    return file_name
-
-def make_commit(repo_path, file_name, date=None):
-    """创建Git提交"""
-    # 添加文件到Git
-    subprocess.run(["git", "add", file_name], cwd=repo_path, check=True)
+    # 周末至少有一半的最大提交数，工作日可能没有提交
+    weekend_min = max(1, args.max_commits // 2)
+    min_commits = [weekend_min if args.weekend_bias and day.weekday() >= 5 else 0 for day in days]
     
-    # 选择随机提交消息
-    commit_message = random.choice(COMMIT_MESSAGES)
+    # 一次性生成每天的提交次数，以及每个提交的(时, 分, 秒, 消息编号, 文件类型编号)
+    if rng is not None:
+        counts = rng.integers(min_commits, args.max_commits + 1).tolist() if min_commits else []
+        total = sum(counts)
+        commits = zip(
+            rng.integers(9, 23, total).tolist(),  # 早9点到晚10点
+            rng.integers(0, 60, total).tolist(),
+            rng.integers(0, 60, total).tolist(),
+            rng.integers(0, len(COMMIT_MESSAGES), total).tolist(),
+            rng.integers(0, len(FILE_TYPES), total).tolist(),
+        )
+    else:
+        counts = [random.randint(low, args.max_commits) for low in min_commits]
+        commits = (
+            (random.randint(9, 22), random.randint(0, 59), random.randint(0, 59),
+             random.randrange(len(COMMIT_MESSAGES)), random.randrange(len(FILE_TYPES)))
+            for _ in range(sum(counts))
+        )
     
-    # 构建提交命令
-    commit_cmd = ["git", "commit", "-m", commit_message]
+    plan = []
+    for day, num_commits in zip(days, counts):
+        for commit_hour, commit_minute, commit_second, msg_idx, ftype_idx in islice(commits, num_commits):
+            commit_date = datetime.datetime(day.year, day.month, day.day, commit_hour, commit_minute, commit_second)
+            plan.append((commit_date, msg_idx, ftype_idx))
     
-    # 如果提供了日期，则设置GIT_AUTHOR_DATE和GIT_COMMITTER_DATE环境变量
-    env = os.environ.copy()
-    if date:
-        date_str = date.strftime("%Y-%m-%d %H:%M:%S")
-        env["GIT_AUTHOR_DATE"] = date_str
-        env["GIT_COMMITTER_DATE"] = date_str
+    return plan
+
+def get_git_ident(repo_path):
+    """获取git配置的提交者身份 (格式: 名字 <邮箱>)"""
+    ident = subprocess.check_output(["git", "var", "GIT_COMMITTER_IDENT"], cwd=repo_path).decode().strip()
+    # 去掉末尾的时间戳和时区
+    return ident.rsplit(" ", 2)[0]
+
+def format_raw_date(date):
+    """将本地时间转换为git fast-import的raw日期格式 (<时间戳> <时区>)"""
+    local = date.astimezone()
+    offset = int(local.utcoffset().total_seconds() // 60)
+    sign = "+" if offset >= 0 else "-"
+    offset = abs(offset)
+    return f"{int(local.timestamp())} {sign}{offset // 60:02d}{offset % 60:02d}"
+
+def ensure_clean_worktree(repo_path):
+    """确认工作区没有未提交的更改，fast-import结束后同步工作区时不会丢失用户的修改"""
+    status = subprocess.check_output(
+        ["git", "status", "--porcelain", "--untracked-files=no"], 
+        cwd=repo_path
+    )
+    if status.strip():
+        raise ValueError("工作区有未提交的更改。请先提交或暂存 (git stash) 这些更改后再运行。")
+
+def start_fast_import(repo_path):
+    """启动一个长期运行的git fast-import进程，所有提交都通过它的标准输入写入"""
+    return subprocess.Popen(["git", "fast-import", "--date-format=raw", "--quiet"], 
+                            cwd=repo_path, stdin=subprocess.PIPE)
+
+def emit_commit(stream, branch, ident, date, file_name, content, message, parent=None):
+    """向fast-import写入一个提交，内容为新增或更新的单个文件"""
+    date_str = format_raw_date(date)
+    message = message.encode("utf-8")
     
-    # 执行提交
-    subprocess.run(commit_cmd, cwd=repo_path, env=env, check=True)
+    record = [
+        f"commit refs/heads/{branch}\n".encode("utf-8"),
+        f"author {ident} {date_str}\n".encode("utf-8"),
+        f"committer {ident} {date_str}\n".encode("utf-8"),
+        f"data {len(message)}\n".encode("utf-8"), message, b"\n",
+    ]
+    # 第一个提交需要接在分支已有的历史之后
+    if parent:
+        record.append(f"from {parent}\n".encode("utf-8"))
+    record += [
+        f"M 100644 inline {file_name}\n".encode("utf-8"),
+        f"data {len(content)}\n".encode("utf-8"), content, b"\n\n",
+    ]
+    stream.write(b"".join(record))
+
+def finish_fast_import(repo_path, importer):
+    """结束fast-import并让索引与新的提交保持一致"""
+    importer.stdin.close()
+    if importer.wait() != 0:
+        raise subprocess.CalledProcessError(importer.returncode, importer.args)
     
-    return commit_message
+    # fast-import只更新分支引用，文件内容没有写入工作区，这里让索引和工作区同步到新的提交
+    # (read-tree -m在会覆盖本地修改或未跟踪文件时报错，而不是像reset --hard那样直接丢弃)
+    subprocess.run(["git", "read-tree", "-u", "-m", "HEAD"], cwd=repo_path, check=True)
 
-def push_to_remote(repo_path, remote="origin", branch="master"):
-    """推送更改到远程仓库"""
+def push_to_remote(repo_path, remote="origin", refs=("master",)):
+    """推送更改到远程仓库 (在所有提交创建完成后调用一次，所有引用原子地一起推送)"""
     try:
-        subprocess.run(["git", "push", remote, branch], cwd=repo_path, check=True)
+        subprocess.run(["git", "push", "--atomic", remote, *refs], cwd=repo_path, check=True)
         return True
     except subprocess.CalledProcessError:
-        print(f"无法推送到远程仓库 {remote}/{branch}。请确保已设置远程仓库并有适当的权限。")
+        print(f"无法推送到远程仓库 {remote}/{' '.join(refs)}。请确保已设置远程仓库并有适当的权限。")
         return False
 
 def init_repo(path):
     """初始化一个新的Git仓库"""
     os.makedirs(path, exist_ok=True)
-    subprocess.run(["git", "init"], cwd=path, check=True)
     
-    # 创建初始提交
     readme_path = os.path.join(path, "README.md")
     with open(readme_path, "w") as f:
         f.write("# GitHub活动模拟器\n\n这是一个用于增加GitHub贡献图活跃度的仓库。这些提交是通过脚本自动生成的。\n")
     
-    subprocess.run(["git", "add", "README.md"], cwd=path, check=True)
-    subprocess.run(["git", "commit", "-m", "初始提交"], cwd=path, check=True)
+    # 初始化仓库并创建初始提交，所有命令在同一个shell中执行
+    run_git_commands(path, [
+        ["git", "init"],
+        # 固定使用master分支，不受init.defaultBranch配置影响
+        ["git", "symbolic-ref", "HEAD", "refs/heads/master"],
+        ["git", "add", "README.md"],
+        ["git", "commit", "-m", "初始提交"],
+    ])
 
 def setup_remote(repo_path, repo_name, remote="origin"):
     """设置远程仓库"""
@@ -149,22 +245,41 @@ def setup_remote(repo_path, repo_name, remote="origin"):
         print(f"无法添加远程仓库。请确保你有权限访问 {remote_url}")
         return False
 
+def get_current_branch(repo_path):
+    """获取当前分支名称，优先直接读取.git/HEAD"""
+    try:
+        with open(os.path.join(repo_path, ".git", "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        head = ""
+    
+    if head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/"):]
+    
+    # 分离头指针等其他情况，交给git处理
+    return subprocess.check_output(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"], 
+        cwd=repo_path
+    ).decode().strip()
+
 def create_orphan_branch(repo_path, branch_name):
     """创建一个孤立的Git分支，没有任何历史记录"""
     try:
-        # 创建并切换到孤立分支
-        subprocess.run(["git", "checkout", "--orphan", branch_name], cwd=repo_path, check=True)
-        
-        # 清除工作区
-        subprocess.run(["git", "rm", "-rf", "."], cwd=repo_path, check=True)
+        # 创建并切换到孤立分支，然后清除工作区
+        run_git_commands(repo_path, [
+            ["git", "checkout", "--orphan", branch_name],
+            ["git", "rm", "-rf", "."],
+        ])
         
         # 创建初始提交
         readme_path = os.path.join(repo_path, "README.md")
         with open(readme_path, "w") as f:
             f.write(f"# 活动模拟分支\n\n这是一个用于增加GitHub贡献图活跃度的孤立分支。这个分支上的所有提交都是通过脚本自动生成的。\n")
         
-        subprocess.run(["git", "add", "README.md"], cwd=repo_path, check=True)
-        subprocess.run(["git", "commit", "-m", "初始提交 (孤立分支)"], cwd=repo_path, check=True)
+        run_git_commands(repo_path, [
+            ["git", "add", "README.md"],
+            ["git", "commit", "-m", "初始提交 (孤立分支)"],
+        ])
         
         print(f"成功创建孤立分支: {branch_name}")
         return True
@@ -177,6 +292,12 @@ def simulate_activity(args):
     method = args.method
     temp_dir = None
     
+    # 统一设置随机种子，并打印出来方便重现
+    seed = args.seed if args.seed is not None else int(time.time())
+    random.seed(seed)
+    rng = np.random.default_rng(seed) if np is not None else None
+    print(f"随机种子: {seed} (使用 --seed {seed} 可以重现同样的提交计划)")
+    
     try:
         if method == "temp-repo":
             # 创建临时目录
@@ -222,10 +343,7 @@ def simulate_activity(args):
                 raise ValueError("当前目录不是Git仓库。请先初始化Git仓库或选择其他方法。")
             
             # 记住当前分支
-            current_branch = subprocess.check_output(
-                ["git", "rev-parse", "--abbrev-ref", "HEAD"], 
-                cwd=os.getcwd()
-            ).decode().strip()
+            current_branch = get_current_branch(os.getcwd())
             
             # 创建孤立分支
             if not create_orphan_branch(os.getcwd(), args.orphan_branch_name):
@@ -241,7 +359,7 @@ def simulate_activity(args):
             branch = None
         
         # 执行模拟
-        do_simulate_activity(args, working_dir, branch)
+        do_simulate_activity(args, working_dir, branch, rng)
         
         # 如果使用orphan-branch方法，切回原来的分支
         if method == "orphan-branch":
@@ -254,128 +372,106 @@ def simulate_activity(args):
             print(f"清理临时目录: {temp_dir}")
             shutil.rmtree(temp_dir)
 
-def do_simulate_activity(args, repo_path, branch):
+def flush_progress(buf):
+    """把缓冲区中的输出一次性写到终端并清空缓冲区"""
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
+    buf.seek(0)
+    buf.truncate()
+
+def do_simulate_activity(args, repo_path, branch, rng=None):
     """实际执行模拟活动的逻辑"""
     # 如果是dry run模式，不需要实际执行
     if args.method == "dry-run":
-        simulate_dry_run(args)
+        simulate_dry_run(args, rng)
         return
     
-    # 获取当前日期
-    today = datetime.datetime.now().date()
+    total_commits = 0
     
-    # 计算起始日期
-    if args.backdate:
-        start_date = today - datetime.timedelta(days=args.days - 1)
-    else:
-        start_date = today
+    # 所有提交通过同一个fast-import进程写入，无需每次提交都启动git
+    ensure_clean_worktree(repo_path)
+    ident = get_git_ident(repo_path)
+    importer = start_fast_import(repo_path)
+    # 第一个提交接在分支已有的历史之后，之后的提交由fast-import自动串联
+    parent = f"refs/heads/{branch}^0"
     
-    total_commits = 0
+    now_dt = datetime.datetime.now()
+    current_date = None
+    # 提交记录先写入缓冲区，批量输出到终端
+    progress = io.StringIO()
     
-    # 循环每一天
-    for day_offset in range(args.days):
-        current_date = start_date + datetime.timedelta(days=day_offset)
-        
-        # 确定这一天的提交次数
-        if args.weekend_bias and current_date.weekday() >= 5:  # 周末 (5=周六, 6=周日)
-            max_commits = args.max_commits
-            min_commits = max(1, args.max_commits // 2)
-        else:
-            max_commits = args.max_commits
-            min_commits = 0  # 工作日可能没有提交
-        
-        # 随机生成这一天的提交次数
-        num_commits = random.randint(min_commits, max_commits)
-        
-        for i in range(num_commits):
-            # 创建基准时间 (当天的随机时间)
-            commit_hour = random.randint(9, 22)  # 早9点到晚10点
-            commit_minute = random.randint(0, 59)
-            commit_second = random.randint(0, 59)
-            
-            commit_date = datetime.datetime(
-                current_date.year, 
-                current_date.month, 
-                current_date.day,
-                commit_hour,
-                commit_minute,
-                commit_second
-            )
+    try:
+        for commit_date, msg_idx, ftype_idx in plan_commits(args, rng):
+            # 非回溯模式下每天刷新一次当前时间，供下面的判断和提交时间使用
+            if commit_date.date() != current_date:
+                current_date = commit_date.date()
+                if not args.backdate:
+                    now_dt = datetime.datetime.now()
             
             # 只有在模拟过去日期或当前日期早于现在时创建提交
-            if args.backdate or commit_date <= datetime.datetime.now():
-                # 创建或更新文件
-                file_name = create_or_update_file(repo_path, args.file_prefix)
+            if args.backdate or commit_date <= now_dt:
+                # 在内存中生成文件内容，不经过工作区 (使用递增序号以确保文件名唯一)
+                file_type = FILE_TYPES[ftype_idx]
+                file_name = f"{args.file_prefix}{total_commits:08d}{file_type[0]}"
+                content = make_content(file_type)
                 
-                # 创建提交
-                commit_message = make_commit(
-                    repo_path, 
+                # 创建提交 (非回溯模式使用当天刷新的当前时间，不必每个提交都调用now())
+                commit_message = COMMIT_MESSAGES[msg_idx]
+                emit_commit(
+                    importer.stdin, 
+                    branch, 
+                    ident, 
+                    commit_date if args.backdate else now_dt, 
                     file_name, 
-                    date=commit_date if args.backdate else None
+                    content, 
+                    commit_message, 
+                    parent
                 )
+                parent = None
                 
                 total_commits += 1
                 
                 date_str = commit_date.strftime("%Y-%m-%d %H:%M:%S")
-                print(f"[{date_str}] 提交: {commit_message} - {file_name}")
+                progress.write(f"[{date_str}] 提交: {commit_message} - {file_name}\n")
+                if total_commits % PROGRESS_FLUSH_EVERY == 0 or args.human_pace:
+                    flush_progress(progress)
                 
-                # 添加随机延迟，使过程看起来更自然
-                time.sleep(random.uniform(0.1, 0.5))
+                # 仅在需要时添加随机延迟，使过程看起来更自然
+                if args.human_pace:
+                    time.sleep(random.uniform(0.1, 0.5))
+    finally:
+        flush_progress(progress)
+        finish_fast_import(repo_path, importer)
     
     print(f"\n成功创建了 {total_commits} 个提交!")
     
     # 如果需要，推送到远程仓库
     if args.push:
         print(f"正在推送到远程仓库 {args.remote}/{branch}...")
-        if push_to_remote(repo_path, args.remote, branch):
+        if push_to_remote(repo_path, args.remote, [branch]):
             print("成功推送到远程仓库")
 
-def simulate_dry_run(args):
+def simulate_dry_run(args, rng=None):
     """执行模拟运行，只打印将会创建的提交，不实际创建"""
-    # 获取当前日期
-    today = datetime.datetime.now().date()
-    
-    # 计算起始日期
-    if args.backdate:
-        start_date = today - datetime.timedelta(days=args.days - 1)
-    else:
-        start_date = today
-    
     total_commits = 0
+    current_date = None
     
     print("\n模拟运行 - 以下是将会创建的提交:")
     print("=" * 60)
     
-    # 循环每一天
-    for day_offset in range(args.days):
-        current_date = start_date + datetime.timedelta(days=day_offset)
-        
-        # 确定这一天的提交次数
-        if args.weekend_bias and current_date.weekday() >= 5:  # 周末 (5=周六, 6=周日)
-            max_commits = args.max_commits
-            min_commits = max(1, args.max_commits // 2)
-        else:
-            max_commits = args.max_commits
-            min_commits = 0  # 工作日可能没有提交
+    for commit_date, msg_idx, ftype_idx in plan_commits(args, rng):
+        # 每天的第一个提交前打印日期
+        if commit_date.date() != current_date:
+            current_date = commit_date.date()
+            print(f"\n日期: {current_date.strftime('%Y-%m-%d')} ({WEEKDAY_ZH[current_date.weekday()]})")
         
-        # 随机生成这一天的提交次数
-        num_commits = random.randint(min_commits, max_commits)
+        commit_time = commit_date.strftime("%H:%M")
+        commit_message = COMMIT_MESSAGES[msg_idx]
+        file_ext, _ = FILE_TYPES[ftype_idx]
         
-        if num_commits > 0:
-            print(f"\n日期: {current_date.strftime('%Y-%m-%d')} ({['周一','周二','周三','周四','周五','周六','周日'][current_date.weekday()]})")
+        print(f"  {commit_time} - {commit_message} (文件类型: {file_ext})")
         
-        for i in range(num_commits):
-            # 创建基准时间 (当天的随机时间)
-            commit_hour = random.randint(9, 22)
-            commit_minute = random.randint(0, 59)
-            
-            commit_time = f"{commit_hour:02d}:{commit_minute:02d}"
-            commit_message = random.choice(COMMIT_MESSAGES)
-            file_ext, _ = random.choice(FILE_TYPES)
-            
-            print(f"  {commit_time} - {commit_message} (文件类型: {file_ext})")
-            
-            total_commits += 1
+        total_commits += 1
     
     print("\n" + "=" * 60)
     print(f"总计: 将创建 {total_commits} 个提交，横跨 {args.days} 天")
@@ -413,6 +509,8 @@ def print_help_and_examples():
     print("  --weekend-bias       - 在周末创建更多提交")
     print("  --push               - 推送到远程仓库 (需要GitHub账户)")
     print("  --keep-temp          - 保留临时目录 (仅适用于temp-repo方法)")
+    print("  --human-pace         - 每次提交后随机等待，模拟人工节奏 (默认关闭)")
+    print("  --seed 42            - 使用固定的随机种子，重现同样的提交计划")
     print("=" * 60)
 
 if __name__ == "__main__":
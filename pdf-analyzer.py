@@ -6,6 +6,9 @@
 import os
 import re
 import json
+import csv
+import math
+import multiprocessing
 import argparse
 import tempfile
 import shutil
@@ -13,6 +16,8 @@ from pathlib import Path
 from collections import Counter, defaultdict
 import datetime
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import pdfplumber
@@ -20,33 +25,29 @@ try:
     import nltk
     from nltk.tokenize import sent_tokenize, word_tokenize
     from nltk.corpus import stopwords
-    from nltk.probability import FreqDist
     from nltk.stem import PorterStemmer, WordNetLemmatizer
-    import matplotlib.pyplot as plt
-    from wordcloud import WordCloud
-    import pandas as pd
     import numpy as np
-    from sklearn.feature_extraction.text import TfidfVectorizer
 except ImportError:
     print("缺少必要的依赖项，正在安装...")
     import subprocess
     subprocess.check_call([
         "pip", "install", 
         "pdfplumber", "tabulate", "nltk", "matplotlib", 
-        "wordcloud", "pandas", "numpy", "scikit-learn"
+        "wordcloud", "pandas", "numpy"
     ])
     import pdfplumber
     from tabulate import tabulate
     import nltk
     from nltk.tokenize import sent_tokenize, word_tokenize
     from nltk.corpus import stopwords
-    from nltk.probability import FreqDist
     from nltk.stem import PorterStemmer, WordNetLemmatizer
-    import matplotlib.pyplot as plt
-    from wordcloud import WordCloud
-    import pandas as pd
     import numpy as np
-    from sklearn.feature_extraction.text import TfidfVectorizer
+
+# PyMuPDF为可选依赖，仅用于提取图片
+try:
+    import fitz
+except ImportError:
+    fitz = None
 
 # 配置日志
 logging.basicConfig(
@@ -83,6 +84,52 @@ SUPPORTED_LANGUAGES = {
     'russian': 'ru',
 }
 
+# clean_text使用的正则表达式
+RE_NEWLINES = re.compile(r'\n+')
+RE_WHITESPACE = re.compile(r'\s+')
+RE_NON_PRINTABLE = re.compile(r'[^\x20-\x7E\n\u4e00-\u9fff]')
+RE_HYPHEN_BREAK = re.compile(r'(\w)-\n(\w)')
+RE_SENTENCE_BREAK = re.compile(r'([.!?])\s*\n([A-Z])')
+RE_NON_ASCII = re.compile(r'[^\x00-\x7F]')
+RE_NON_ASCII_WHITESPACE = re.compile(r'[^\S\x00-\x7F]')
+
+# 中文和日文按句末标点分句（Punkt模型是针对英文等语言训练的）
+RE_CJK_SENTENCE = re.compile(r'[^。．！？]+[。．！？]*')
+
+# 纯ASCII文本中需要移除的非打印字符（保留换行符），用于str.translate
+ASCII_NON_PRINTABLE = {c: None for c in [*range(0x20), 0x7F] if c != ord('\n')}
+
+# str.split()视为空白的ASCII字符，用于按字节统计单词数
+ASCII_WHITESPACE = np.zeros(256, dtype=bool)
+ASCII_WHITESPACE[[0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20]] = True
+
+# 语言检测只需要文档开头的这么多字符
+LANGUAGE_DETECT_CHARS = 2000
+
+# 支持中文/日文的字体，启动时找到第一个存在的字体
+CJK_FONT_CANDIDATES = [
+    '/System/Library/Fonts/PingFang.ttc',  # macOS
+    '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',  # Linux
+    'C:/Windows/Fonts/simhei.ttf',  # Windows
+    'C:/Windows/Fonts/msgothic.ttc'  # Windows (日文)
+]
+CJK_FONT_PATH = next((font for font in CJK_FONT_CANDIDATES if os.path.exists(font)), None)
+
+# 少于这个页数时直接在当前进程中逐页处理，不启动进程池
+PARALLEL_MIN_PAGES = 4
+
+# 并发写出小文件（每页文本、表格）的线程数
+FILE_WRITE_WORKERS = 8
+
+# 每个任务最多处理的页数，限制同时留在内存中的页面结果
+MAX_PAGES_PER_CHUNK = 50
+
+# 词干提取器和词形还原器只创建一次，并缓存每个单词的处理结果
+STEMMER = PorterStemmer()
+LEMMATIZER = WordNetLemmatizer()
+stem_token = functools.lru_cache(maxsize=100000)(STEMMER.stem)
+lemmatize_token = functools.lru_cache(maxsize=100000)(LEMMATIZER.lemmatize)
+
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description="智能PDF分析与提取工具")
@@ -122,12 +169,18 @@ def parse_arguments():
     parser.add_argument("--visualize", "-v", action="store_true",
                         help="生成可视化（词云、页面分布等）")
     
+    parser.add_argument("--dpi", type=int, default=150,
+                        help="可视化图片的分辨率（默认：150）")
+    
     parser.add_argument("--clean", "-c", action="store_true",
                         help="清理提取的文本（移除多余空格、特殊字符等）")
     
     parser.add_argument("--detect-language", "-d", action="store_true",
                         help="尝试自动检测文档语言")
     
+    parser.add_argument("--streaming", action="store_true",
+                        help="逐页写出文本而不在内存中保留全文（适合超大PDF，将跳过关键词、摘要和词云）")
+    
     parser.add_argument("--verbose", action="store_true",
                         help="显示详细日志")
     
@@ -198,98 +251,140 @@ def create_output_directory(pdf_path, output_dir):
         "analysis": analysis_dir
     }
 
-def extract_text_from_pdf(pdf, pages, clean=False):
-    """从PDF提取文本"""
-    all_text = []
-    page_texts = {}
+def split_pages(pages, n_chunks):
+    """将页面列表切分为最多n_chunks段连续的页面"""
+    seg_size = math.ceil(len(pages) / n_chunks)
+    return [pages[i:i + seg_size] for i in range(0, len(pages), seg_size)]
+
+def map_page_chunks(worker, pdf_path, pages, *extra):
+    """按页面段调用worker，页数较多时使用进程池并行处理，按页面顺序逐个生成结果"""
+    if not pages:
+        return
     
-    for i, page_num in enumerate(pages):
-        logger.info(f"提取文本：第 {page_num+1} 页")
-        
-        try:
-            page = pdf.pages[page_num]
-            text = page.extract_text() or ""
-            
-            if clean:
-                # 清理文本
-                text = clean_text(text)
+    n_workers = min(os.cpu_count() or 1, len(pages))
+    n_chunks = math.ceil(len(pages) / MAX_PAGES_PER_CHUNK)
+    
+    if len(pages) < PARALLEL_MIN_PAGES or n_workers < 2:
+        for chunk in split_pages(pages, n_chunks):
+            yield from worker((pdf_path, chunk) + extra)
+        return
+    
+    # 每个子进程自己打开PDF（pdfplumber对象无法在进程间传递）
+    vectors = [(pdf_path, chunk) + extra for chunk in split_pages(pages, max(n_workers, n_chunks))]
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        for results in pool.imap(worker, vectors):
+            yield from results
+
+def extract_text_chunk(task):
+    """提取一段页面的文本，返回[(页码, 文本), ...]，出错的页面文本为None"""
+    pdf_path, pages, clean = task
+    results = []
+    
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in pages:
+            logger.info(f"提取文本：第 {page_num+1} 页")
+            
+            try:
+                page = pdf.pages[page_num]
+                text = page.extract_text() or ""
+                # 释放pdfplumber缓存的版面对象，避免大文档占用过多内存
+                page.flush_cache()
+                
+                if clean:
+                    # 清理文本
+                    text = clean_text(text)
+                
+            except Exception as e:
+                logger.error(f"提取第 {page_num+1} 页文本时出错: {e}")
+                text = None
             
-            all_text.append(text)
-            page_texts[page_num] = text
+            results.append((page_num, text))
+    
+    return results
+
+def extract_text_from_pdf(pdf_path, pages, clean=False):
+    """从PDF逐页提取文本，按页面顺序生成(页码, 文本)，出错的页面文本为None"""
+    yield from map_page_chunks(extract_text_chunk, pdf_path, pages, clean)
+
+def extract_tables_chunk(task):
+    """提取一段页面的表格，返回[(页码, [过滤后的表格, ...]), ...]"""
+    pdf_path, pages = task
+    results = []
+    
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in pages:
+            logger.info(f"提取表格：第 {page_num+1} 页")
+            
+            try:
+                page = pdf.pages[page_num]
+                tables = page.extract_tables()
+                page.flush_cache()
+                
+                # 过滤空单元格和空行（每行只生成一次过滤后的列表）
+                filtered_tables = [
+                    [filtered_row for filtered_row in ([cell for cell in row if cell is not None] for row in table)
+                     if filtered_row]
+                    for table in tables or []
+                ]
+                
+                results.append((page_num, filtered_tables))
             
-        except Exception as e:
-            logger.error(f"提取第 {page_num+1} 页文本时出错: {e}")
-            page_texts[page_num] = ""
+            except Exception as e:
+                logger.error(f"提取第 {page_num+1} 页表格时出错: {e}")
     
-    return "\n\n".join(all_text), page_texts
+    return results
 
-def extract_tables_from_pdf(pdf, pages, output_dirs, table_format):
+def extract_tables_from_pdf(pdf_path, pages, output_dirs, table_format):
     """从PDF提取表格"""
     all_tables = []
     page_tables = defaultdict(list)
-    
-    for i, page_num in enumerate(pages):
-        logger.info(f"提取表格：第 {page_num+1} 页")
-        
-        try:
-            page = pdf.pages[page_num]
-            tables = page.extract_tables()
-            
-            if tables:
-                for t_idx, table in enumerate(tables):
-                    # 过滤空行和空列
-                    filtered_table = []
-                    for row in table:
-                        filtered_row = [cell for cell in row if cell is not None]
-                        if filtered_row:
-                            filtered_table.append(filtered_row)
+    # Excel格式的表格最后一次性写入同一个工作簿，每个表格一个工作表
+    excel_tables = []
+    
+    # CSV和JSON文件交给线程池写出，保存函数自己记录错误
+    with ThreadPoolExecutor(max_workers=FILE_WRITE_WORKERS) as writer:
+        for page_num, tables in map_page_chunks(extract_tables_chunk, pdf_path, pages):
+            for t_idx, filtered_table in enumerate(tables):
+                if filtered_table:
+                    all_tables.append(filtered_table)
+                    page_tables[page_num].append(filtered_table)
                     
-                    if filtered_table:
-                        all_tables.append(filtered_table)
-                        page_tables[page_num].append(filtered_table)
-                        
-                        # 保存表格
-                        if "csv" in table_format or "all" in table_format:
-                            save_table_as_csv(
-                                filtered_table, 
-                                os.path.join(output_dirs["tables"], f"表格_页面{page_num+1}_{t_idx+1}.csv")
-                            )
-                        
-                        if "excel" in table_format or "all" in table_format:
-                            save_table_as_excel(
-                                filtered_table, 
-                                os.path.join(output_dirs["tables"], f"表格_页面{page_num+1}_{t_idx+1}.xlsx")
-                            )
-                        
-                        if "json" in table_format or "all" in table_format:
-                            save_table_as_json(
-                                filtered_table, 
-                                os.path.join(output_dirs["tables"], f"表格_页面{page_num+1}_{t_idx+1}.json")
-                            )
-        
-        except Exception as e:
-            logger.error(f"提取第 {page_num+1} 页表格时出错: {e}")
+                    # 保存表格
+                    if "csv" in table_format or "all" in table_format:
+                        writer.submit(
+                            save_table_as_csv,
+                            filtered_table, 
+                            os.path.join(output_dirs["tables"], f"表格_页面{page_num+1}_{t_idx+1}.csv")
+                        )
+                    
+                    if "excel" in table_format or "all" in table_format:
+                        excel_tables.append((f"页面{page_num+1}_{t_idx+1}", filtered_table))
+                    
+                    if "json" in table_format or "all" in table_format:
+                        writer.submit(
+                            save_table_as_json,
+                            filtered_table, 
+                            os.path.join(output_dirs["tables"], f"表格_页面{page_num+1}_{t_idx+1}.json")
+                        )
+    
+    if excel_tables:
+        save_tables_as_excel(excel_tables, os.path.join(output_dirs["tables"], "所有表格.xlsx"))
     
     return all_tables, page_tables
 
-def extract_images_from_pdf(pdf, pages, output_dirs):
-    """从PDF提取图片"""
-    page_images = defaultdict(list)
-    total_images = 0
-    
-    for i, page_num in enumerate(pages):
-        logger.info(f"提取图片：第 {page_num+1} 页")
-        
-        try:
-            page = pdf.pages[page_num]
-            
-            # PDFPlumber不直接支持图像提取，我们使用替代方法
-            # 这里使用PyMuPDF (fitz) 如果它可用
-            if 'fitz' in globals() or 'fitz' in locals():
-                import fitz
-                pdf_fitz = fitz.open(pdf._stream.name)
+def extract_images_chunk(task):
+    """提取一段页面的图片并保存，返回[(页码, [图片路径, ...]), ...]"""
+    pdf_path, pages, images_dir = task
+    results = []
+    
+    # 每段页面只打开一次文档（PyMuPDF不支持多线程，因此按进程并行）
+    with fitz.open(pdf_path) as pdf_fitz:
+        for page_num in pages:
+            logger.info(f"提取图片：第 {page_num+1} 页")
+            
+            image_paths = []
+            try:
                 fitz_page = pdf_fitz[page_num]
-                
                 image_list = fitz_page.get_images(full=True)
                 
                 for img_idx, img_info in enumerate(image_list):
@@ -298,15 +393,28 @@ def extract_images_from_pdf(pdf, pages, output_dirs):
                     image_data = base_image["image"]
                     
                     # 保存图片
-                    image_path = os.path.join(output_dirs["images"], f"图片_页面{page_num+1}_{img_idx+1}.png")
+                    image_path = os.path.join(images_dir, f"图片_页面{page_num+1}_{img_idx+1}.png")
                     with open(image_path, "wb") as img_file:
                         img_file.write(image_data)
                     
-                    page_images[page_num].append(image_path)
-                    total_images += 1
+                    image_paths.append(image_path)
+                
+            except Exception as e:
+                logger.error(f"提取第 {page_num+1} 页图片时出错: {e}")
             
-        except Exception as e:
-            logger.error(f"提取第 {page_num+1} 页图片时出错: {e}")
+            results.append((page_num, image_paths))
+    
+    return results
+
+def extract_images_from_pdf(pdf_path, pages, output_dirs):
+    """从PDF提取图片"""
+    page_images = defaultdict(list)
+    total_images = 0
+    
+    for page_num, image_paths in map_page_chunks(extract_images_chunk, pdf_path, pages, output_dirs["images"]):
+        if image_paths:
+            page_images[page_num].extend(image_paths)
+            total_images += len(image_paths)
     
     return page_images, total_images
 
@@ -322,24 +430,38 @@ def extract_pdf_metadata(pdf):
 def clean_text(text):
     """清理文本，移除多余空格和特殊字符"""
     # 替换多个换行符为单个
-    text = re.sub(r'\n+', '\n', text)
+    text = RE_NEWLINES.sub('\n', text)
     
     # 替换多个空格为单个
-    text = re.sub(r'\s+', ' ', text)
+    text = RE_WHITESPACE.sub(' ', text)
     
-    # 移除非打印字符
-    text = re.sub(r'[^\x20-\x7E\n\u4e00-\u9fff]', '', text)
+    # 移除非打印字符（纯ASCII文本用translate，其余情况才需要正则）
+    if not RE_NON_ASCII.search(text):
+        text = text.translate(ASCII_NON_PRINTABLE)
+    else:
+        text = RE_NON_PRINTABLE.sub('', text)
     
     # 修复断行造成的单词分割
-    text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+    text = RE_HYPHEN_BREAK.sub(r'\1\2', text)
     
     # 修复句子在换行处的中断
-    text = re.sub(r'([.!?])\s*\n([A-Z])', r'\1 \2', text)
+    text = RE_SENTENCE_BREAK.sub(r'\1 \2', text)
     
     return text.strip()
 
 def detect_language(text):
-    """检测文本语言"""
+    """检测文本语言（只使用文本开头的一部分）"""
+    text = text[:LANGUAGE_DETECT_CHARS]
+    
+    # 优先使用基于C++的pycld3，未安装时回退到langdetect
+    try:
+        import cld3
+        prediction = cld3.get_language(text)
+        if prediction is not None and prediction.is_reliable:
+            return prediction.language
+    except ImportError:
+        pass
+    
     try:
         from langdetect import detect
         return detect(text)
@@ -350,6 +472,27 @@ def detect_language(text):
         logger.error(f"检测语言时出错: {e}")
         return None
 
+def count_words(text, language):
+    """统计单词数（中文和日文不以空格分词，使用字符数代替）"""
+    if language in ['chinese', 'japanese']:
+        return len(text)
+    
+    # 按字节统计只能识别ASCII空白，含不间断空格、全角空格等Unicode空白时使用split()
+    if RE_NON_ASCII_WHITESPACE.search(text):
+        return len(text.split())
+    
+    # 在UTF-8字节上统计从空白进入非空白的次数，不需要像split()那样生成单词列表
+    buf = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    is_word = ~ASCII_WHITESPACE[buf]
+    return int(np.count_nonzero(is_word[1:] & ~is_word[:-1])) + int(is_word[:1].sum())
+
+def split_sentences(text, language):
+    """将文本分割为句子"""
+    if language in ['chinese', 'japanese']:
+        return [s.strip() for s in RE_CJK_SENTENCE.findall(text) if s.strip()]
+    else:
+        return sent_tokenize(text)
+
 def tokenize_text(text, language):
     """将文本分词"""
     if language in ['chinese', 'japanese']:
@@ -358,12 +501,13 @@ def tokenize_text(text, language):
     else:
         return word_tokenize(text)
 
+@functools.lru_cache(maxsize=None)
 def get_stopwords(language):
-    """获取指定语言的停用词"""
+    """获取指定语言的停用词（每种语言只读取一次语料）"""
     if language in stopwords.fileids():
-        return set(stopwords.words(language))
+        return frozenset(stopwords.words(language))
     else:
-        return set()
+        return frozenset()
 
 def process_tokens(tokens, language, remove_stopwords=True, stemming=False, lemmatization=True):
     """处理分词（移除停用词，词干提取等）"""
@@ -372,121 +516,125 @@ def process_tokens(tokens, language, remove_stopwords=True, stemming=False, lemm
               if token.isalpha() or (language in ['chinese', 'japanese'] and token.strip())]
     
     # 移除停用词
-    if remove_stopwords and language in stopwords.fileids():
+    if remove_stopwords:
         stop_words = get_stopwords(language)
-        tokens = [token for token in tokens if token.lower() not in stop_words]
+        if stop_words:
+            tokens = [token for token in tokens if token not in stop_words]
     
     # 对英语等语言进行词干提取或词形还原
     if language == 'english':
         if stemming:
-            stemmer = PorterStemmer()
-            tokens = [stemmer.stem(token) for token in tokens]
+            tokens = [stem_token(token) for token in tokens]
         elif lemmatization:
-            lemmatizer = WordNetLemmatizer()
-            tokens = [lemmatizer.lemmatize(token) for token in tokens]
+            tokens = [lemmatize_token(token) for token in tokens]
     
     return tokens
 
-def extract_keywords(text, language, n_keywords=20):
-    """提取关键词"""
+def extract_keywords(text, language, n_keywords=20, processed_tokens=None):
+    """提取关键词（可传入已处理好的分词结果，避免重复分词）"""
     if not text:
         return []
     
-    # 分词
-    tokens = tokenize_text(text, language)
-    
-    # 处理分词
-    processed_tokens = process_tokens(tokens, language)
-    
-    # 使用TF-IDF提取关键词
-    if len(processed_tokens) > 20:  # 只在文本足够长时使用TF-IDF
-        try:
-            vectorizer = TfidfVectorizer(max_features=n_keywords * 2)
-            X = vectorizer.fit_transform([text])
-            feature_names = vectorizer.get_feature_names_out()
-            
-            tfidf_scores = zip(feature_names, X.toarray()[0])
-            sorted_keywords = sorted(tfidf_scores, key=lambda x: x[1], reverse=True)
-            
-            return [(word, score) for word, score in sorted_keywords[:n_keywords]]
+    if processed_tokens is None:
+        # 分词
+        tokens = tokenize_text(text, language)
         
-        except Exception as e:
-            logger.error(f"TF-IDF提取关键词出错: {e}")
+        # 处理分词
+        processed_tokens = process_tokens(tokens, language)
     
-    # 回退到频率分析
-    fdist = FreqDist(processed_tokens)
-    return fdist.most_common(n_keywords)
+    # 按词频提取关键词（单个文档的TF-IDF中所有词的IDF都相同，结果等同于词频）
+    return Counter(processed_tokens).most_common(n_keywords)
 
-def extract_summary(text, language, n_sentences=5):
-    """提取摘要（最重要的句子）"""
+def top_k_indices(values, k):
+    """返回values中最大的k个值的下标（升序排列），值相同时下标靠前的优先，只做O(n)的部分排序"""
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    if k >= len(values):
+        return np.arange(len(values))
+    
+    # 第k大的值作为阈值：严格大于阈值的全部入选，等于阈值的按下标顺序补足
+    threshold = -np.partition(-values, k - 1)[k - 1]
+    above = np.flatnonzero(values > threshold)
+    ties = np.flatnonzero(values == threshold)[:k - len(above)]
+    return np.sort(np.concatenate((above, ties)))
+
+def tokenize_sentences(sentences, language):
+    """对每个句子分词并处理，返回每个句子的分词列表"""
+    return [process_tokens(tokenize_text(sentence, language), language) for sentence in sentences]
+
+def extract_summary(text, language, n_sentences=5, sentences=None, sentence_tokens=None):
+    """提取摘要（最重要的句子，可传入已分好的句子和分词结果避免重复处理）"""
     if not text:
         return ""
     
     # 分割句子
-    sentences = sent_tokenize(text)
+    if sentences is None:
+        sentences = split_sentences(text, language)
     
     if len(sentences) <= n_sentences:
         return text
     
-    # 计算每个句子的权重
-    sentence_weights = {}
+    # 每个句子只分词一次，全文的分词结果就是各句分词结果的拼接
+    if sentence_tokens is None:
+        sentence_tokens = tokenize_sentences(sentences, language)
+    all_tokens = [token for tokens in sentence_tokens for token in tokens]
     
     # 从整个文本中提取关键词
-    keywords = extract_keywords(text, language, n_keywords=30)
+    keywords = extract_keywords(text, language, n_keywords=30, processed_tokens=all_tokens)
     keyword_dict = {word: score for word, score in keywords}
     
-    for sentence in sentences:
-        tokens = tokenize_text(sentence, language)
-        processed_tokens = process_tokens(tokens, language)
-        
-        # 句子权重基于其包含的关键词
-        weight = sum(keyword_dict.get(token, 0) for token in processed_tokens)
-        
-        # 句子长度也考虑进去（避免太短的句子）
-        length_factor = min(1.0, len(processed_tokens) / 20.0)
-        
-        # 综合权重
-        sentence_weights[sentence] = weight * length_factor
+    # 句子权重基于其包含的关键词：对所有分词的得分做前缀和，按句子边界相减得到每句的得分之和
+    token_scores = np.fromiter((keyword_dict.get(token, 0) for token in all_tokens), dtype=np.float64, count=len(all_tokens))
+    lengths = np.fromiter((len(tokens) for tokens in sentence_tokens), dtype=np.int64, count=len(sentence_tokens))
+    score_sums = np.concatenate(([0.0], np.cumsum(token_scores)))
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    weights = score_sums[bounds[1:]] - score_sums[bounds[:-1]]
     
-    # 根据权重选择最重要的句子
-    important_sentences = sorted(sentence_weights.items(), key=lambda x: x[1], reverse=True)
+    # 句子长度也考虑进去（避免太短的句子），得到综合权重
+    sentence_weights = weights * np.minimum(1.0, lengths / 20.0)
     
-    # 保持句子原有顺序
-    summary_sentences = [s for s, _ in important_sentences[:n_sentences]]
-    ordered_summary = [s for s in sentences if s in summary_sentences]
+    # 根据权重选择最重要的句子，并保持句子原有顺序
+    ordered_summary = [sentences[i] for i in top_k_indices(sentence_weights, n_sentences)]
     
     return " ".join(ordered_summary)
 
-def create_wordcloud(text, language, output_path):
-    """创建词云"""
+@functools.lru_cache(maxsize=1)
+def get_figure():
+    """获取所有图表共用的Figure对象（首次调用时才导入matplotlib）"""
+    import matplotlib
+    matplotlib.use('Agg')  # 只需要保存图片，不需要图形界面
+    import matplotlib.pyplot as plt
+    
+    return plt.figure()
+
+def reset_figure(figsize):
+    """清空共用的Figure并设置尺寸，返回Figure和新的坐标轴"""
+    fig = get_figure()
+    fig.clear()
+    fig.set_size_inches(figsize)
+    return fig, fig.add_subplot(111)
+
+def create_wordcloud(text, language, output_path, word_freq=None, dpi=150):
+    """创建词云（可传入已统计好的词频，跳过分词）"""
     if not text:
         return False
     
     try:
-        # 分词和处理
-        tokens = tokenize_text(text, language)
-        processed_tokens = process_tokens(tokens, language)
+        # 只有生成词云时才需要导入wordcloud
+        from wordcloud import WordCloud
         
-        # 创建词频字典
-        word_freq = FreqDist(processed_tokens)
+        if word_freq is None:
+            # 分词和处理
+            tokens = tokenize_text(text, language)
+            processed_tokens = process_tokens(tokens, language)
+            
+            # 创建词频字典
+            word_freq = Counter(processed_tokens)
         
         # 设置词云参数
         if language in ['chinese', 'japanese']:
-            font_path = None
-            # 尝试找到支持中文/日文的字体
-            possible_fonts = [
-                '/System/Library/Fonts/PingFang.ttc',  # macOS
-                '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',  # Linux
-                'C:/Windows/Fonts/simhei.ttf',  # Windows
-                'C:/Windows/Fonts/msgothic.ttc'  # Windows (日文)
-            ]
-            for font in possible_fonts:
-                if os.path.exists(font):
-                    font_path = font
-                    break
-            
             wordcloud = WordCloud(
-                font_path=font_path,
+                font_path=CJK_FONT_PATH,
                 width=800, height=400,
                 background_color='white',
                 max_words=100
@@ -501,12 +649,11 @@ def create_wordcloud(text, language, output_path):
         wordcloud.generate_from_frequencies(word_freq)
         
         # 保存词云图片
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        fig, ax = reset_figure((10, 5))
+        ax.imshow(wordcloud, interpolation='bilinear')
+        ax.axis('off')
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
         
         return True
     
@@ -514,27 +661,23 @@ def create_wordcloud(text, language, output_path):
         logger.error(f"创建词云时出错: {e}")
         return False
 
-def create_page_distribution_chart(page_texts, output_path):
-    """创建页面内容分布图表"""
+def create_page_distribution_chart(page_lengths, output_path, dpi=150):
+    """创建页面内容分布图表（page_lengths为每页的字符数）"""
     try:
-        # 计算每页的字符数
-        page_lengths = {page: len(text) for page, text in page_texts.items()}
-        
         pages = sorted(page_lengths.keys())
         lengths = [page_lengths[page] for page in pages]
         
         # 页码从1开始显示
         x_labels = [str(page + 1) for page in pages]
         
-        plt.figure(figsize=(12, 6))
-        plt.bar(x_labels, lengths, color='skyblue')
-        plt.xlabel('页码')
-        plt.ylabel('字符数')
-        plt.title('PDF页面内容分布')
-        plt.xticks(rotation=90)
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        fig, ax = reset_figure((12, 6))
+        ax.bar(x_labels, lengths, color='skyblue')
+        ax.set_xlabel('页码')
+        ax.set_ylabel('字符数')
+        ax.set_title('PDF页面内容分布')
+        ax.tick_params(axis='x', labelrotation=90)
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
         
         return True
     
@@ -545,18 +688,25 @@ def create_page_distribution_chart(page_texts, output_path):
 def save_table_as_csv(table, output_path):
     """将表格保存为CSV文件"""
     try:
-        df = pd.DataFrame(table)
-        df.to_csv(output_path, index=False, header=False, encoding='utf-8-sig')
+        # 各行补齐到相同列数，与按DataFrame导出时一致
+        width = max(len(row) for row in table)
+        with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows(row + [""] * (width - len(row)) for row in table)
         return True
     except Exception as e:
         logger.error(f"保存表格为CSV时出错: {e}")
         return False
 
-def save_table_as_excel(table, output_path):
-    """将表格保存为Excel文件"""
+def save_tables_as_excel(named_tables, output_path):
+    """将多个表格保存到同一个Excel文件中，named_tables为[(工作表名, 表格), ...]"""
     try:
-        df = pd.DataFrame(table)
-        df.to_excel(output_path, index=False, header=False)
+        # 只有导出Excel时才需要pandas
+        import pandas as pd
+        
+        with pd.ExcelWriter(output_path) as writer:
+            for sheet_name, table in named_tables:
+                df = pd.DataFrame(table)
+                df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
         return True
     except Exception as e:
         logger.error(f"保存表格为Excel时出错: {e}")
@@ -593,6 +743,11 @@ def save_table_as_json(table, output_path):
         logger.error(f"保存表格为JSON时出错: {e}")
         return False
 
+def write_text_file(path, text):
+    """将文本写入文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
 def generate_report(pdf_info, output_path):
     """生成分析报告"""
     try:
@@ -686,20 +841,45 @@ def analyze_pdf(args):
             
             # 提取文本
             all_text = ""
-            page_texts = {}
+            page_lengths = {}
+            text_stats = {"char_count": 0, "word_count": 0, "sentence_count": 0}
             if args.extract_mode in ["text", "all"]:
-                all_text, page_texts = extract_text_from_pdf(pdf, pages, args.clean)
+                text_parts = []
+                wrote_text = False
+                page_writes = []
                 
-                # 保存整体文本
+                # 每提取一页就写入整体文本和每页文本，不等待全部页面完成
                 text_file = os.path.join(output_dirs["text"], "完整文本.txt")
-                with open(text_file, 'w', encoding='utf-8') as f:
-                    f.write(all_text)
-                
-                # 保存每页文本
-                for page_num, text in page_texts.items():
-                    page_file = os.path.join(output_dirs["text"], f"页面{page_num+1}.txt")
-                    with open(page_file, 'w', encoding='utf-8') as f:
+                with ThreadPoolExecutor(max_workers=FILE_WRITE_WORKERS) as writer, \
+                        open(text_file, 'w', encoding='utf-8') as f:
+                    for page_num, text in extract_text_from_pdf(pdf_path, pages, args.clean):
+                        # 保存每页文本（交给线程池写出）
+                        page_file = os.path.join(output_dirs["text"], f"页面{page_num+1}.txt")
+                        page_writes.append(writer.submit(write_text_file, page_file, text or ""))
+                        page_lengths[page_num] = len(text or "")
+                        
+                        if text is None:
+                            continue
+                        
+                        # 保存整体文本（页面之间以空行分隔）
+                        if wrote_text:
+                            f.write("\n\n")
                         f.write(text)
+                        
+                        if args.streaming:
+                            # 流式模式只保留统计数据
+                            text_stats["char_count"] += len(text) + (2 if wrote_text else 0)
+                            text_stats["word_count"] += count_words(text, args.language)
+                            text_stats["sentence_count"] += len(split_sentences(text, args.language)) if text else 0
+                        else:
+                            text_parts.append(text)
+                        wrote_text = True
+                
+                # 写入每页文本时的错误在这里抛出
+                for future in page_writes:
+                    future.result()
+                
+                all_text = "\n\n".join(text_parts)
                 
                 logger.info(f"已提取并保存文本")
             
@@ -718,31 +898,34 @@ def analyze_pdf(args):
             all_tables = []
             page_tables = {}
             if args.extract_mode in ["tables", "all"]:
-                all_tables, page_tables = extract_tables_from_pdf(pdf, pages, output_dirs, args.table_format)
+                all_tables, page_tables = extract_tables_from_pdf(pdf_path, pages, output_dirs, args.table_format)
                 logger.info(f"已提取并保存 {len(all_tables)} 个表格")
             
             # 提取图片
             page_images = {}
             total_images = 0
             if args.extract_mode in ["images", "all"]:
-                try:
-                    import fitz
-                    page_images, total_images = extract_images_from_pdf(pdf, pages, output_dirs)
+                if fitz is not None:
+                    page_images, total_images = extract_images_from_pdf(pdf_path, pages, output_dirs)
                     logger.info(f"已提取并保存 {total_images} 张图片")
-                except ImportError:
+                else:
                     logger.warning("未安装PyMuPDF(fitz)，无法提取图片")
             
-            # 文本分析（如果有文本）
-            text_stats = {
-                "char_count": len(all_text),
-                "word_count": len(all_text.split()),
-                "sentence_count": len(sent_tokenize(all_text)) if all_text else 0
-            }
+            # 文本分析（如果有文本），分句和分词结果同时用于统计、关键词、摘要和词云
+            sentences = split_sentences(all_text, language) if all_text else []
+            sentence_tokens = tokenize_sentences(sentences, language)
+            all_tokens = [token for tokens in sentence_tokens for token in tokens]
+            if not args.streaming:
+                text_stats = {
+                    "char_count": len(all_text),
+                    "word_count": count_words(all_text, language),
+                    "sentence_count": len(sentences)
+                }
             
             # 提取关键词
             keywords = []
             if all_text:
-                keywords = extract_keywords(all_text, language, args.keywords)
+                keywords = extract_keywords(all_text, language, args.keywords, all_tokens)
                 
                 # 保存关键词
                 keyword_file = os.path.join(output_dirs["analysis"], "关键词.txt")
@@ -755,7 +938,7 @@ def analyze_pdf(args):
             # 提取摘要
             summary = ""
             if all_text:
-                summary = extract_summary(all_text, language, args.summary_length)
+                summary = extract_summary(all_text, language, args.summary_length, sentences, sentence_tokens)
                 
                 # 保存摘要
                 summary_file = os.path.join(output_dirs["analysis"], "摘要.txt")
@@ -766,17 +949,18 @@ def analyze_pdf(args):
             
             # 可视化
             visualizations = {}
-            if args.visualize and all_text:
+            if args.visualize:
                 # 词云
-                wordcloud_path = os.path.join(output_dirs["analysis"], "词云.png")
-                if create_wordcloud(all_text, language, wordcloud_path):
-                    visualizations["词云"] = wordcloud_path
-                    logger.info(f"已生成词云")
+                if all_text:
+                    wordcloud_path = os.path.join(output_dirs["analysis"], "词云.png")
+                    if create_wordcloud(all_text, language, wordcloud_path, Counter(all_tokens), args.dpi):
+                        visualizations["词云"] = wordcloud_path
+                        logger.info(f"已生成词云")
                 
                 # 页面分布图
-                if page_texts:
+                if page_lengths and (all_text or args.streaming):
                     distribution_path = os.path.join(output_dirs["analysis"], "页面分布.png")
-                    if create_page_distribution_chart(page_texts, distribution_path):
+                    if create_page_distribution_chart(page_lengths, distribution_path, args.dpi):
                         visualizations["页面分布"] = distribution_path
                         logger.info(f"已生成页面分布图")
             
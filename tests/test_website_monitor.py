@@ -0,0 +1,61 @@
+"""
+网站变化监控器的测试
+"""
+
+import re
+import unittest
+import importlib.util
+from pathlib import Path
+
+MODULE_PATH = Path(__file__).resolve().parent.parent / "website-monitor.py"
+
+
+def load_module():
+    """加载website-monitor.py，缺少依赖时跳过测试"""
+    spec = importlib.util.spec_from_file_location("website_monitor", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        raise unittest.SkipTest(f"缺少依赖: {e}")
+    return module
+
+
+class IgnorePatternsTest(unittest.TestCase):
+    """忽略模式必须与逐个调用re.sub的结果一致，否则已保存的基准内容会产生误报"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.monitor = load_module()
+
+    def baseline(self, patterns, content):
+        for pattern in patterns:
+            content = re.sub(pattern, '', content)
+        return content
+
+    def test_patterns_applied_in_order(self):
+        patterns = ['b', 'ab']
+        content = 'abcABCaa'
+
+        result = content
+        for regex in self.monitor.compile_ignore_patterns(tuple(patterns)):
+            result = regex.sub('', result)
+
+        self.assertEqual(result, 'acABCaa')
+        self.assertEqual(result, self.baseline(patterns, content))
+
+    def test_extract_content_matches_baseline(self):
+        patterns = ['b', 'ab', r'\d{4}-\d{2}-\d{2}']
+        html = '<html><body><p>abcABCaa 2024-01-01 更新</p></body></html>'
+
+        content = self.monitor.extract_content(html, 'body', patterns)
+
+        self.assertEqual(content, ' '.join(self.baseline(patterns, 'abcABCaa 2024-01-01 更新').split()))
+
+    def test_invalid_pattern_is_skipped(self):
+        compiled = self.monitor.compile_ignore_patterns(('[', 'x'))
+        self.assertEqual([regex.pattern for regex in compiled], ['x'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,11 +14,29 @@ import difflib
 import smtplib
 import requests
 import logging
+import functools
+import gzip
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer, Comment
+
+# 优先使用基于C的lxml解析器，未安装时回退到内置的html.parser
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# 安装了selectolax时使用更快的Lexbor解析器提取内容，否则使用BeautifulSoup
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
 
 # 日志配置
 logging.basicConfig(
@@ -28,6 +46,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger('website_monitor')
 
+# 只包含一个ID、类名或标签名的简单CSS选择器
+RE_SIMPLE_SELECTOR = re.compile(r'^([#.]?)([A-Za-z][\w-]*)$')
+
+# 文档中只会出现一次的标签，选择器为这些标签或ID时只查找第一个匹配
+SINGLE_ELEMENT_TAGS = frozenset(('html', 'head', 'body', 'title'))
+
+# Myers差异算法允许的最大编辑距离，超过时回退到difflib（限制回溯记录占用的内存）
+MYERS_MAX_EDITS = 2000
+
+# HTML差异报告中每处变化前后显示的上下文行数
+HTML_DIFF_CONTEXT_LINES = 3
+
+# HTTP连接池大小（每个主机保持的连接数）
+HTTP_POOL_SIZE = 32
+
+# 共享的HTTP会话，跨站点和守护进程的多轮检查复用TCP/TLS连接（重试由fetch_website_content处理）
+SESSION = requests.Session()
+for prefix in ('http://', 'https://'):
+    SESSION.mount(prefix, HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0))
+
+# 流式读取响应体时每次读取的字节数
+FETCH_CHUNK_SIZE = 64 * 1024
+
+# 守护进程中state.json的最短写入间隔（秒）
+STATE_FLUSH_INTERVAL = 300
+
+# 各站点的检查状态（站点哈希 -> 最后检查时间、ETag/Last-Modified、内容哈希），保存在内存中并定期写入state.json
+STATE = {}
+STATE_STATUS = {'loaded': False, 'dirty': False, 'flushed_at': 0.0, 'legacy_files': []}
+STATE_LOCK = threading.Lock()
+
+# 服务器返回304（内容未修改）时fetch_website_content的返回值
+NOT_MODIFIED = object()
+
 # 默认配置
 DEFAULT_CONFIG = {
     "check_interval": 3600,  # 检查间隔（秒）
@@ -35,7 +87,10 @@ DEFAULT_CONFIG = {
     "timeout": 30,
     "retry_count": 3,
     "retry_delay": 5,
+    "max_workers": 8,  # 并行检查网站的线程数
+    "max_bytes": 5000000,  # 单个页面允许下载的最大字节数（解压后）
     "data_dir": "monitor_data",
+    "always_write_html_diff": False,  # 未启用邮件通知时也在每次变化时生成HTML差异报告（否则在 --diff 时生成）
     "notification": {
         "email": {
             "enabled": False,
@@ -55,7 +110,7 @@ DEFAULT_CONFIG = {
             "name": "示例网站",
             "url": "https://example.com",
             "selector": "body",  # CSS选择器，用于筛选要监控的内容
-            "ignore_patterns": [],  # 忽略内容的正则表达式
+            "ignore_patterns": [],  # 忽略内容的正则表达式（作用于提取出的文本）
             "check_interval": None,  # 特定于此站点的检查间隔（覆盖全局设置）
             "active": True
         }
@@ -202,33 +257,69 @@ def list_monitored_sites(config):
     
     print("-" * 70)
 
+@functools.lru_cache(maxsize=1024)
+def get_site_hash(url):
+    """计算网站URL的哈希（128位十六进制），仅用于目录命名"""
+    return hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+
 def get_site_data_path(config, site):
     """获取网站数据存储路径"""
     data_dir = Path(config['data_dir'])
     data_dir.mkdir(exist_ok=True)
     
     # 使用网站URL的哈希作为目录名，避免特殊字符问题
-    site_hash = hashlib.md5(site['url'].encode()).hexdigest()
-    site_dir = data_dir / site_hash
+    site_dir = data_dir / get_site_hash(site['url'])
+    
+    # 迁移旧版本以MD5命名的目录
+    if not site_dir.exists():
+        legacy_dir = data_dir / hashlib.md5(site['url'].encode()).hexdigest()
+        if legacy_dir.exists():
+            legacy_dir.rename(site_dir)
+    
     site_dir.mkdir(exist_ok=True)
     
     return site_dir
 
-def fetch_website_content(url, config):
-    """获取网站内容"""
-    headers = {
-        'User-Agent': config['user_agent'],
-    }
+def fetch_website_content(url, config, conditional=None):
+    """获取网站内容，传入conditional时发送条件请求并用响应中的ETag/Last-Modified更新它"""
+    headers = {}
+    if conditional:
+        if conditional.get('etag'):
+            headers['If-None-Match'] = conditional['etag']
+        if conditional.get('last_modified'):
+            headers['If-Modified-Since'] = conditional['last_modified']
     
     for attempt in range(config['retry_count']):
         try:
-            response = requests.get(
-                url, 
-                headers=headers, 
-                timeout=config['timeout']
-            )
-            response.raise_for_status()
-            return response.text
+            response = SESSION.get(url, headers=headers, timeout=config['timeout'], stream=True)
+            try:
+                if response.status_code == 304:
+                    return NOT_MODIFIED
+                response.raise_for_status()
+                
+                # 流式读取响应体（gzip/deflate由requests自动解压），超过大小上限时放弃该页面
+                max_bytes = config['max_bytes']
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        logger.error(f"{url} 的内容超过 {max_bytes} 字节，已跳过")
+                        return None
+                    chunks.append(chunk)
+            finally:
+                response.close()
+            
+            if conditional is not None:
+                conditional['etag'] = response.headers.get('ETag')
+                conditional['last_modified'] = response.headers.get('Last-Modified')
+            
+            # 使用响应头声明的编码，未声明或无法识别时按UTF-8解码，不做chardet编码探测
+            body = b''.join(chunks)
+            try:
+                return body.decode(response.encoding or 'utf-8', errors='replace')
+            except LookupError:
+                return body.decode('utf-8', errors='replace')
         except requests.RequestException as e:
             if attempt < config['retry_count'] - 1:
                 logger.warning(f"获取 {url} 失败: {e}。重试中...")
@@ -237,45 +328,113 @@ def fetch_website_content(url, config):
                 logger.error(f"获取 {url} 失败: {e}")
                 return None
 
-def extract_content(html, selector, ignore_patterns):
-    """提取并清理网站内容"""
-    try:
-        soup = BeautifulSoup(html, 'html.parser')
+def extract_text_lexbor(html, selector):
+    """使用selectolax(Lexbor)提取选择器匹配元素的文本"""
+    tree = LexborHTMLParser(html)
+    
+    # 移除脚本和样式元素（注释不是文本节点，不会出现在文本中）
+    for node in tree.css('script, style'):
+        node.decompose()
+    
+    # 使用选择器提取内容（只有一个目标的选择器找到第一个匹配即停止）
+    if is_single_match_selector(selector):
+        node = tree.css_first(selector)
+        nodes = [node] if node is not None else []
+    else:
+        nodes = tree.css(selector) if selector else []
+    if selector and not nodes:
+        logger.warning(f"选择器 '{selector}' 未匹配任何内容")
+    if not nodes:
+        nodes = [tree.root] if tree.root is not None else []
+    
+    return ''.join(node.text() for node in nodes)
+
+@functools.lru_cache(maxsize=256)
+def simple_selector_filter(selector):
+    """将简单选择器（#id、.class或标签名）转换为SoupStrainer/find_all的参数，其他选择器返回None"""
+    match = RE_SIMPLE_SELECTOR.match(selector.strip()) if selector else None
+    if not match:
+        return None
+    
+    prefix, name = match.groups()
+    if prefix == '#':
+        return {'id': name}
+    if prefix == '.':
+        return {'class_': name}
+    return {'name': name.lower()}
+
+def is_single_match_selector(selector):
+    """判断选择器是否只匹配一个元素（ID选择器或只出现一次的标签）"""
+    selector_filter = simple_selector_filter(selector)
+    if selector_filter is None:
+        return False
+    return 'id' in selector_filter or selector_filter.get('name') in SINGLE_ELEMENT_TAGS
+
+@functools.lru_cache(maxsize=256)
+def compile_ignore_patterns(patterns):
+    """编译并缓存站点的忽略模式，按配置顺序逐个应用（前一个模式删除文本后可能使后一个模式匹配）"""
+    compiled = []
+    for pattern in patterns:
+        try:
+            compiled.append(re.compile(pattern))
+        except re.error as e:
+            logger.error(f"无效的正则表达式 '{pattern}': {e}")
+    
+    return tuple(compiled)
+
+def remove_non_text_nodes(soup):
+    """移除脚本、样式元素和注释"""
+    for tag in soup(['script', 'style']):
+        tag.decompose()
+    
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+def extract_text_bs4(html, selector):
+    """使用BeautifulSoup提取选择器匹配元素的文本（只解析一次文档）"""
+    elements = None
+    
+    # 简单选择器只解析匹配的元素，并用find/find_all代替CSS选择
+    selector_filter = simple_selector_filter(selector)
+    if selector_filter:
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer(**selector_filter))
+        remove_non_text_nodes(soup)
+        if is_single_match_selector(selector):
+            element = soup.find(**selector_filter)
+            elements = [element] if element is not None else []
+        else:
+            elements = soup.find_all(**selector_filter)
+    
+    # 复杂选择器或简单选择器没有匹配时，解析整个文档
+    if not elements:
+        soup = BeautifulSoup(html, HTML_PARSER)
+        remove_non_text_nodes(soup)
         
         # 使用选择器提取内容
         if selector:
             elements = soup.select(selector)
             if not elements:
                 logger.warning(f"选择器 '{selector}' 未匹配任何内容")
-                content = str(soup)
-            else:
-                content = ''.join(str(element) for element in elements)
+        if not elements:
+            elements = [soup]
+    
+    # 获取文本内容
+    return ''.join(element.get_text() for element in elements)
+
+def extract_content(html, selector, ignore_patterns):
+    """提取并清理网站内容"""
+    try:
+        if LexborHTMLParser is not None:
+            content = extract_text_lexbor(html, selector)
         else:
-            content = str(soup)
-        
-        # 应用忽略模式
-        for pattern in ignore_patterns:
-            try:
-                content = re.sub(pattern, '', content)
-            except re.error as e:
-                logger.error(f"无效的正则表达式 '{pattern}': {e}")
-        
-        # 净化HTML
-        text_soup = BeautifulSoup(content, 'html.parser')
+            content = extract_text_bs4(html, selector)
         
-        # 移除脚本和样式元素
-        for script in text_soup(['script', 'style']):
-            script.decompose()
-        
-        # 移除注释
-        for comment in text_soup.findAll(text=lambda text: isinstance(text, str) and '<!--' in text):
-            comment.extract()
-        
-        # 获取文本内容
-        clean_content = text_soup.get_text()
+        # 应用忽略模式（作用于提取出的文本）
+        for regex in compile_ignore_patterns(tuple(ignore_patterns)):
+            content = regex.sub('', content)
         
         # 规范化空白
-        clean_content = re.sub(r'\s+', ' ', clean_content).strip()
+        clean_content = ' '.join(content.split())
         
         return clean_content
     
@@ -284,19 +443,42 @@ def extract_content(html, selector, ignore_patterns):
         return html
 
 def save_content(content, file_path):
-    """保存内容到文件"""
+    """保存内容到文件（.gz文件使用gzip压缩），先写临时文件再原子替换，避免写入中断损坏文件"""
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        if file_path.suffix == '.gz':
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                f.write(content)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         logger.error(f"保存内容到 {file_path} 时出错: {e}")
         return False
 
+def remove_legacy_file(file_path):
+    """删除已迁移到新格式的旧版本文件，避免之后回退时读到过期的数据"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除旧文件 {file_path} 时出错: {e}")
+
 def load_content(file_path):
-    """从文件加载内容"""
+    """从文件加载内容（.gz文件不存在时回退到旧版本的未压缩文件）"""
+    file_path = Path(file_path)
     try:
-        if not os.path.exists(file_path):
+        if file_path.suffix == '.gz':
+            if file_path.exists():
+                with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                    return f.read()
+            file_path = file_path.with_suffix('')
+        
+        if not file_path.exists():
             return None
         
         with open(file_path, 'r', encoding='utf-8') as f:
@@ -305,31 +487,122 @@ def load_content(file_path):
         logger.error(f"从 {file_path} 加载内容时出错: {e}")
         return None
 
+def myers_diff(a, b, max_edits=MYERS_MAX_EDITS):
+    """使用Myers O((N+M)D)算法比较两组行，返回与difflib.Differ相同格式的行（'  '、'- '、'+ '开头），编辑距离超过max_edits时返回None"""
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    
+    # v[offset + k]为对角线k上当前能到达的最远x，trace保存每一轮开始时k在[-d-1, d+1]范围内的值
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    
+    for d in range(max_d + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            
+            # 沿对角线跳过相同的行
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            
+            v[offset + k] = x
+            
+            if x >= n and y >= m:
+                return myers_backtrack(a, b, trace)
+    
+    return None
+
+def myers_backtrack(a, b, trace):
+    """根据Myers算法的记录从终点回溯出编辑过程"""
+    x, y = len(a), len(b)
+    lines = []
+    
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        
+        # v中下标i对应对角线i - d - 1
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            lines.append('  ' + a[x])
+        
+        if d > 0:
+            if x == prev_x:
+                lines.append('+ ' + b[prev_y])
+            else:
+                lines.append('- ' + a[prev_x])
+        
+        x, y = prev_x, prev_y
+    
+    lines.reverse()
+    return lines
+
+def trim_common_lines(a, b):
+    """去掉两组行开头和结尾相同的部分，返回中间可能不同的部分"""
+    n, m = len(a), len(b)
+    
+    i = 0
+    while i < n and i < m and a[i] == b[i]:
+        i += 1
+    
+    j = 0
+    while j < n - i and j < m - i and a[n - 1 - j] == b[m - 1 - j]:
+        j += 1
+    
+    return a[i:n - j], b[i:m - j]
+
 def compute_diff(old_content, new_content):
     """计算两个内容之间的差异"""
     if not old_content or not new_content:
         return None
     
-    differ = difflib.Differ()
-    diff = list(differ.compare(old_content.splitlines(), new_content.splitlines()))
+    # 只比较中间不同的部分（结果只包含增删行，不需要调整行号）
+    old_lines, new_lines = trim_common_lines(old_content.splitlines(), new_content.splitlines())
+    
+    diff = myers_diff(old_lines, new_lines)
+    if diff is None:
+        # 变化太多时回退到difflib的unified_diff（不生成Differ的"? "提示行），并转换为相同的"+ "/"- "格式
+        unified = difflib.unified_diff(old_lines, new_lines, n=0, lineterm='')
+        diff = [line[0] + ' ' + line[1:] for line in unified
+                if line.startswith(('+', '-')) and not line.startswith(('+++', '---'))]
     
     # 过滤只包含相同内容的行
-    changes = [line for line in diff if line.startswith('+ ') or line.startswith('- ')]
+    changes = '\n'.join(line for line in diff if line.startswith(('+ ', '- ')))
     
-    return '\n'.join(changes) if changes else None
+    return changes or None
 
-def format_diff_html(old_content, new_content, site_name, url):
+def format_diff_html(old_content, new_content, site_name, url, detected_at=None):
     """创建HTML格式的差异报告"""
     if not old_content or not new_content:
         return f"<p>无法为 {site_name} 创建差异报告</p>"
     
-    # 创建HTML差异
+    if detected_at is None:
+        detected_at = datetime.datetime.now()
+    
+    # 创建HTML差异（只输出变化处及其上下文，而不是整个文档）
     d = difflib.HtmlDiff()
     html_diff = d.make_file(
         old_content.splitlines(), 
         new_content.splitlines(),
         fromdesc=f"先前版本",
-        todesc=f"当前版本"
+        todesc=f"当前版本",
+        context=True,
+        numlines=HTML_DIFF_CONTEXT_LINES
     )
     
     # 改进HTML输出，使其更现代化、响应式
@@ -363,7 +636,7 @@ def format_diff_html(old_content, new_content, site_name, url):
         <div class="header">
             <h2>{site_name}</h2>
             <p><a href="{url}" target="_blank">{url}</a></p>
-            <p>变化检测时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p>变化检测时间: {detected_at.strftime('%Y-%m-%d %H:%M:%S')}</p>
         </div>
         '''
     )
@@ -510,6 +783,90 @@ def test_notification(config):
     else:
         print("ℹ️ 桌面通知已禁用")
 
+def hash_content(content):
+    """计算提取内容的SHA-256哈希"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def load_state(config):
+    """从state.json加载所有站点的检查状态"""
+    state_file = Path(config['data_dir']) / "state.json"
+    
+    with STATE_LOCK:
+        if STATE_STATUS['loaded']:
+            return
+        STATE_STATUS['loaded'] = True
+        
+        if state_file.exists():
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    STATE.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"加载状态文件 {state_file} 时出错: {e}")
+
+def get_site_state(config, site):
+    """获取网站的检查状态，state.json中没有时读取旧版本的last_check.json"""
+    site_hash = get_site_hash(site['url'])
+    
+    with STATE_LOCK:
+        if site_hash in STATE:
+            return STATE[site_hash]
+    
+    check_info = None
+    last_check_file = get_site_data_path(config, site) / "last_check.json"
+    if last_check_file.exists():
+        try:
+            with open(last_check_file, 'r', encoding='utf-8') as f:
+                check_info = json.load(f)
+        except (OSError, ValueError):
+            pass
+    
+    with STATE_LOCK:
+        if site_hash in STATE or check_info is None:
+            return STATE.setdefault(site_hash, {})
+        
+        # 迁移到state.json，写入成功后删除旧文件
+        STATE[site_hash] = check_info
+        STATE_STATUS['dirty'] = True
+        STATE_STATUS['legacy_files'].append(last_check_file)
+        return check_info
+
+def save_check_info(site, conditional, content_hash):
+    """在内存中更新最后检查时间、条件请求所需的验证信息和内容哈希"""
+    check_info = {
+        "timestamp": time.time(),
+        "datetime": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "etag": conditional.get('etag'),
+        "last_modified": conditional.get('last_modified'),
+        "content_hash": content_hash
+    }
+    
+    with STATE_LOCK:
+        STATE[get_site_hash(site['url'])] = check_info
+        STATE_STATUS['dirty'] = True
+
+def flush_state(config, force=False):
+    """将检查状态写入state.json，非强制时距上次写入不足STATE_FLUSH_INTERVAL秒则跳过"""
+    with STATE_LOCK:
+        if not STATE_STATUS['dirty']:
+            return
+        if not force and time.time() - STATE_STATUS['flushed_at'] < STATE_FLUSH_INTERVAL:
+            return
+        
+        content = json.dumps(STATE, ensure_ascii=False, indent=4)
+        legacy_files = STATE_STATUS['legacy_files']
+        STATE_STATUS['legacy_files'] = []
+        STATE_STATUS['dirty'] = False
+        STATE_STATUS['flushed_at'] = time.time()
+    
+    if save_content(content, Path(config['data_dir']) / "state.json"):
+        # 旧版本的last_check.json已合并到state.json中
+        for legacy_file in legacy_files:
+            remove_legacy_file(legacy_file)
+    else:
+        with STATE_LOCK:
+            STATE_STATUS['legacy_files'].extend(legacy_files)
+            STATE_STATUS['dirty'] = True
+
 def check_website_changes(site, config, force_update=False):
     """检查网站变化"""
     logger.info(f"检查网站: {site['name']} ({site['url']})")
@@ -518,44 +875,69 @@ def check_website_changes(site, config, force_update=False):
     site_dir = get_site_data_path(config, site)
     
     # 内容文件路径
-    content_file = site_dir / "content.txt"
+    content_file = site_dir / "content.txt.gz"
+    previous_file = site_dir / "previous.txt.gz"
     html_file = site_dir / "raw.html"
     diff_file = site_dir / "diff.txt"
     html_diff_file = site_dir / "diff.html"
-    last_check_file = site_dir / "last_check.json"
+    
+    # 读取上次响应的ETag/Last-Modified和内容哈希（强制更新或没有基准内容时发送普通请求）
+    conditional = {}
+    previous_hash = None
+    
+    # 旧版本保存的未压缩content.txt同样视为已有基准内容
+    has_baseline = content_file.exists() or content_file.with_suffix('').exists()
+    if not force_update and has_baseline:
+        last_check_info = get_site_state(config, site)
+        conditional['etag'] = last_check_info.get('etag')
+        conditional['last_modified'] = last_check_info.get('last_modified')
+        previous_hash = last_check_info.get('content_hash')
     
     # 获取当前网站内容
-    html_content = fetch_website_content(site['url'], config)
+    html_content = fetch_website_content(site['url'], config, conditional)
+    
+    # 服务器确认内容未修改，只更新检查时间
+    if html_content is NOT_MODIFIED:
+        save_check_info(site, conditional, previous_hash)
+        logger.info(f"未检测到 {site['name']} 的内容变化（304 Not Modified）")
+        return False
     
     if not html_content:
         logger.error(f"无法获取 {site['name']} 的内容")
         return False
     
-    # 保存原始HTML
-    save_content(html_content, html_file)
-    
     # 提取和清理内容
     extracted_content = extract_content(
         html_content, 
         site.get('selector', 'body'),
         site.get('ignore_patterns', [])
     )
+    content_hash = hash_content(extracted_content)
+    
+    # 内容哈希与上次相同时无需读取旧内容和计算差异
+    if previous_hash and content_hash == previous_hash:
+        save_check_info(site, conditional, content_hash)
+        logger.info(f"未检测到 {site['name']} 的内容变化")
+        return False
+    
+    # 保存原始HTML
+    save_content(html_content, html_file)
     
     # 加载以前的内容
     previous_content = load_content(content_file)
     
+    # 基准内容来自旧版本的content.txt时，迁移为压缩文件，写入成功后删除旧文件
+    if previous_content and not content_file.exists():
+        if save_content(previous_content, content_file):
+            remove_legacy_file(content_file.with_suffix(''))
+    
     # 如果是第一次检查或强制更新，保存当前内容作为基准
     if not previous_content or force_update:
         logger.info(f"为 {site['name']} 创建新的基准内容")
         save_content(extracted_content, content_file)
         
         # 更新最后检查时间
-        check_info = {
-            "timestamp": time.time(),
-            "datetime": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        with open(last_check_file, 'w', encoding='utf-8') as f:
-            json.dump(check_info, f, ensure_ascii=False, indent=4)
+        save_check_info(site, conditional, content_hash)
         
         return False
     
@@ -563,12 +945,7 @@ def check_website_changes(site, config, force_update=False):
     diff = compute_diff(previous_content, extracted_content)
     
     # 更新最后检查时间
-    check_info = {
-        "timestamp": time.time(),
-        "datetime": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    with open(last_check_file, 'w', encoding='utf-8') as f:
-        json.dump(check_info, f, ensure_ascii=False, indent=4)
+    save_check_info(site, conditional, content_hash)
     
     # 如果有变化
     if diff:
@@ -577,9 +954,13 @@ def check_website_changes(site, config, force_update=False):
         # 保存差异
         save_content(diff, diff_file)
         
-        # 创建HTML差异报告
-        html_diff = format_diff_html(previous_content, extracted_content, site['name'], site['url'])
-        save_content(html_diff, html_diff_file)
+        # 保存变化前的内容，供 --diff 时生成HTML差异报告
+        save_content(previous_content, previous_file)
+        
+        # 仅在启用邮件通知或配置要求时立即创建HTML差异报告
+        if config['notification']['email'].get('enabled') or config.get('always_write_html_diff'):
+            html_diff = format_diff_html(previous_content, extracted_content, site['name'], site['url'])
+            save_content(html_diff, html_diff_file)
         
         # 更新当前内容
         save_content(extracted_content, content_file)
@@ -604,11 +985,21 @@ def display_diff(site, config):
     site_dir = get_site_data_path(config, site)
     diff_file = site_dir / "diff.txt"
     html_diff_file = site_dir / "diff.html"
+    content_file = site_dir / "content.txt.gz"
+    previous_file = site_dir / "previous.txt.gz"
     
     if not os.path.exists(diff_file):
         print(f"未找到 {site['name']} 的差异记录")
         return
     
+    # HTML差异报告不存在或早于最近一次变化时，根据保存的前后内容生成
+    if previous_file.exists() and (not html_diff_file.exists() or
+                                   html_diff_file.stat().st_mtime < previous_file.stat().st_mtime):
+        detected_at = datetime.datetime.fromtimestamp(previous_file.stat().st_mtime)
+        html_diff = format_diff_html(load_content(previous_file), load_content(content_file),
+                                     site['name'], site['url'], detected_at)
+        save_content(html_diff, html_diff_file)
+    
     print(f"\n{site['name']} 的内容变化:")
     print("-" * 50)
     
@@ -636,27 +1027,33 @@ def check_sites(config, reset_site=None):
         logger.warning("监控列表为空。使用 --add-site 添加网站。")
         return
     
+    load_state(config)
+    
     # 如果指定了重置特定网站，仅处理该网站
     if reset_site:
         site = find_site_by_name_or_url(sites, reset_site)
         if site:
             logger.info(f"重置 {site['name']} 的基准内容")
             check_website_changes(site, config, force_update=True)
+            flush_state(config, force=True)
         else:
             logger.error(f"未找到网站: {reset_site}")
         return
     
-    changes_detected = False
-    
+    active_sites = []
     for site in sites:
         if not site.get('active', True):
             logger.info(f"跳过已禁用的网站: {site['name']}")
             continue
-        
-        if check_website_changes(site, config):
-            changes_detected = True
+        active_sites.append(site)
     
-    return changes_detected
+    # 检查以网络I/O为主，在线程池中并行检查各网站
+    with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
+        results = list(executor.map(lambda site: check_website_changes(site, config), active_sites))
+    
+    flush_state(config, force=True)
+    
+    return any(results)
 
 def run_daemon(config, args):
     """作为守护进程运行"""
@@ -667,40 +1064,44 @@ def run_daemon(config, args):
         logger.error("监控列表为空。使用 --add-site 添加网站。")
         return
     
+    load_state(config)
+    executor = ThreadPoolExecutor(max_workers=config['max_workers'])
+    
     try:
         while True:
             # 记录当前时间
             now = time.time()
+            due_sites = []
             
             for site in sites:
                 if not site.get('active', True):
                     continue
                 
-                # 获取站点的最后检查时间
-                site_dir = get_site_data_path(config, site)
-                last_check_file = site_dir / "last_check.json"
-                
-                last_check_time = 0
-                if os.path.exists(last_check_file):
-                    try:
-                        with open(last_check_file, 'r', encoding='utf-8') as f:
-                            last_check_info = json.load(f)
-                            last_check_time = last_check_info.get('timestamp', 0)
-                    except:
-                        last_check_time = 0
+                # 获取站点的最后检查时间（来自内存中的状态）
+                last_check_time = get_site_state(config, site).get('timestamp', 0)
                 
                 # 确定检查间隔（优先使用站点特定的间隔）
                 check_interval = site.get('check_interval') or config['check_interval']
                 
                 # 如果超过了检查间隔，检查此网站
                 if now - last_check_time >= check_interval:
-                    check_website_changes(site, config)
+                    due_sites.append(site)
+            
+            # 并行检查到期的网站，全部完成后再进入下一轮
+            list(executor.map(lambda site: check_website_changes(site, config), due_sites))
+            
+            # 定期将检查状态写入state.json
+            flush_state(config)
             
             # 休眠一段时间
             time.sleep(60)  # 每分钟检查一次是否有网站需要监控
     
     except KeyboardInterrupt:
         logger.info("监控器已停止")
+    
+    finally:
+        executor.shutdown(wait=False)
+        flush_state(config, force=True)
 
 def main():
     """主函数"""
@@ -721,6 +1122,9 @@ def main():
     if not config:
         return
     
+    # 在共享会话上设置一次User-Agent
+    SESSION.headers['User-Agent'] = config['user_agent']
+    
     # 添加网站
     if args.add_site:
         add_site_to_config(args.config, config)